@@ -31,9 +31,23 @@ from qgis.PyQt.QtCore import *
 from qgis.PyQt.QtWidgets import *
 from enum import Enum
 import processing
+import contextlib
 import copy
+import functools
+import json
+from collections import Counter
 
 import os
+import shutil
+import threading
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+import numpy as np
+from osgeo import gdal
+from osgeo import ogr
+
+from .SuricatesRaster import *
 
 ## @brief toolbox for debug functions
 #
@@ -69,38 +83,77 @@ import os
 #  dummyFunction2 end
 # dummyFunction end
 # ```
+#
+# the debug mode is set with Debug.configure: when it is disabled, the calls do nothing (there is no test of Debug.enabled at each call).
 class Debug():
-    ## @brief display debug text is true
+    ## @brief display debug text is true (read only: use Debug.configure)
     enabled = False
 
     ## @brief indentation variable
     __indentDebug = 0;
 
-    ## @brief display text (start of a function) if debug mode
+    ## @brief enable or disable the debug mode
+    # @param enabled display debug text if true
+    @classmethod
+    def configure(cls, enabled):
+        cls.enabled = enabled
+        if enabled:
+            cls.begin = staticmethod(cls.traceBegin)
+            cls.print = staticmethod(cls.tracePrint)
+            cls.end = staticmethod(cls.traceEnd)
+        else:
+            cls.begin = cls.print = cls.end = staticmethod(cls.ignore)
+
+    ## @brief do nothing (debug mode disabled)
     @staticmethod
-    def begin(text):
-        if Debug.enabled:
-            for i in range(0, Debug.__indentDebug):
-                text = " " + text;
-            print(text + " begin")
-            Debug.__indentDebug = Debug.__indentDebug + 1
+    def ignore(text):
+        pass
 
-    ## @brief display text if debug mode
+    ## @brief display text (start of a function)
     @staticmethod
-    def print(text):
-        if Debug.enabled:
-            for i in range(0, Debug.__indentDebug):
-                text = " " + text;
-            print(text)
+    def traceBegin(text):
+        print(" " * Debug.__indentDebug + text + " begin")
+        Debug.__indentDebug = Debug.__indentDebug + 1
 
-    ## @brief display text (end of a function) if debug mode
+    ## @brief display text
+    @staticmethod
+    def tracePrint(text):
+        print(" " * Debug.__indentDebug + text)
+
+    ## @brief display text (end of a function)
     @staticmethod
-    def end(text):
-        if Debug.enabled:
-            Debug.__indentDebug = Debug.__indentDebug - 1
-            for i in range(0, Debug.__indentDebug):
-                text = " " + text;
-            print(text + " end")
+    def traceEnd(text):
+        Debug.__indentDebug = Debug.__indentDebug - 1
+        print(" " * Debug.__indentDebug + text + " end")
+
+    ## @brief decorator which displays the start and the end of a method if debug mode
+    # @param text name displayed (example: `"Class::method"`)
+    # @return the decorator
+    #
+    # the mode is read when the method is defined (import of the module): if the debug mode is disabled, the method is not wrapped and costs nothing.
+    @staticmethod
+    def traced(text):
+        def decorator(function):
+            if not Debug.enabled: return function
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                Debug.traceBegin(text)
+                try: return function(*args, **kwargs)
+                finally: Debug.traceEnd(text)
+            return wrapper
+        return decorator
+
+    ## @brief display text (start of a function) if debug mode
+    begin = ignore
+
+    ## @brief display text if debug mode
+    print = ignore
+
+    ## @brief display text (end of a function) if debug mode
+    end = ignore
+
+# the debug mode may be enabled without editing the plugin: SURICATES_DEBUG=1 in the environment of QGIS
+Debug.configure(Debug.enabled or os.environ.get("SURICATES_DEBUG", "0") not in ("", "0"))
 
 ## @brief corresponds to the differents constraint types
 #
@@ -120,6 +173,17 @@ class ConstraintType(Enum):
     ## @brief global working area of the project
     Map=5
 
+## @brief number of layers created by SuricatesAlgo to compute each constraint type with the proximity of GDAL (targets and distances)
+#
+# the distance transform in memory and the constant constraints don't create layers.
+constraintSteps = {ConstraintType.Attractive: 2, ConstraintType.Repulsive: 2}
+
+## @brief text of each constraint type (saved in the field typeIn and typeOut of the layer *config_project*)
+constraintTypeNames = {constraintType: constraintType.name for constraintType in ConstraintType}
+
+## @brief constraint type of each text of SuricatesApp.constraintTypeNames
+constraintTypesByName = {name: constraintType for constraintType, name in constraintTypeNames.items()}
+
 ## @brief structure for constraint information
 #
 # This structure is an interface between the file of the layer *config_project*, the ConstraintWidget (user interface) and the SuricatesAlgo (task)
@@ -177,17 +241,12 @@ class ConstraintItem:
 # - bufferVector: create a vector layer (.shp) from another with a buffer
 # - rasterize: create a raster layer (.tif) from a vector layer
 # - proximity: create a raster layer (.tif) from distance of filled zones
-# - clip: create a raster layer (.tif) with clipping of a raster layer by another
-# - invert: create a raster layer (.sdat: saga library) with inversion of data and no-data cells
-# - convertSagaOutput: convert .sdat raster layer to .tif raster layer
-# - mergeLayers: merge two layers (.tif): complete no_data cells by content of the second layer
-# - normalizeRaster: normalize a raster (.tif)
-# - thresholdRaster: binarize raster with a threshold (.tif)
 #
 # list of advanced algorithms:
 # - rasterizeWithBuffer: use methods bufferVector and rasterize (.tif)
-# - calculateTheConstraintOfProximity: create a proximity raster with clipping and normalization (.tif)
-# - calculateTheConstraintWithConstant: set a value to a raster
+# - calculateTheConstraintOfProximity: compute the proximity with clipping and normalization (in memory)
+# - calculateTheConstraintWithConstant: set a value to an area (in memory)
+# - computeConstraint: create the raster of a constraint (.tif): inside and outside areas computed in memory
 #
 # # Using
 # this class is initialized by four parameters:
@@ -211,7 +270,7 @@ class SuricatesAlgo(QgsTask):
     # list of constraints to compute
 
     ## @var createdFiles
-    # list of created temporary files during the computation
+    # set of created temporary files during the computation (a file is removed from it when it is kept)
 
     ## @var suricatesInstance
     # current SuricatesInstance
@@ -222,24 +281,99 @@ class SuricatesAlgo(QgsTask):
     ## @var counter
     # number of filename created (include in the temporary filenames)
 
+    ## @var lock
+    # lock which protects the counter and the list of created files: constraints are computed in parallel
+
     ## @var date
     # date of the creation of the classe (include in the temporary filenames)
 
     ## @var time
     # time of the creation of the classe (include in the temporary filenames)
 
+    ## @var token
+    # short random identifier of the task (include in the temporary filenames): two tasks created at the same time don't share their filenames
+
     ## @var tmpPath
     # absolute path for temporary files
 
     ## @var extent
     # boundary box of the current working area
 
+    ## @var extentBounds
+    # boundary box of the current working area as values: (xMin, xMax, yMin, yMax, CRS authid), SuricatesAlgo.extent is formated from it
+
     ## @var maxprogress
     # number of temporary file which must be created during the computation
 
     ## @var outputs
     # list of important temporary files (rasters of each constrained layer, raster of cumulation of rasters, raster with threshold)
 
+    ## @var typesIn
+    # ConstraintType values of the typeIn of the constraints (numpy array indexed like SuricatesAlgo.constraints)
+
+    ## @var typesOut
+    # ConstraintType values of the typeOut of the constraints (numpy array indexed like SuricatesAlgo.constraints)
+
+    ## @var active
+    # constraints which create a raster: neither the map nor fully sanctuarized (numpy array of booleans indexed like SuricatesAlgo.constraints)
+
+    ## @var keepInMemory
+    # keep the intermediate rasters in memory if they are small enough (see SuricatesAlgo.reserveMemory)
+
+    ## @var memoryUsed
+    # size (bytes) of the rasters kept in memory by the task (see SuricatesAlgo.reserveMemory)
+
+    ## @var rasterCache
+    # rasterized layers of the previous computations, key: SuricatesAlgo.rasterCacheKey (saved in the file SuricatesAlgo.rasterCacheName)
+
+    ## @var rasterCacheName
+    # file of the temporary path where the rasterized layers are registred between the tasks
+
+    ## @var pinnedRasters
+    # cached rasters read by the task, counted in SuricatesAlgo.rasterCacheUsers until the task saves the cache
+
+    ## @var useGdalProximity
+    # use the proximity algorithm of GDAL (gdal.ComputeProximity, like *gdal:proximity*) instead of the distance transform in memory (default if numba is not available)
+
+    ## @var progressEvents
+    # progress of the worker threads (values of SuricatesAlgo.counter), the progress is displayed by the thread of the task (see SuricatesAlgo.updateProgress)
+
+    ## @var taskThread
+    # identifier of the thread which runs the task: the other threads don't call setProgress
+
+    ## @brief layer class used to open a file, key: extension of the file
+    layerLoaders = {'.tif': QgsRasterLayer, '.tiff': QgsRasterLayer, '.sdat': QgsRasterLayer, '.vrt': QgsRasterLayer,
+                    '.shp': QgsVectorLayer, '.gpkg': QgsVectorLayer, '.geojson': QgsVectorLayer}
+
+    ## @brief number of constraints computed at the same time
+    maxWorkers = os.cpu_count() or 1
+
+    ## @brief maximum number of rasterized layers kept in the cache (see SuricatesAlgo.rasterCache), the least recently used are deleted
+    rasterCacheSize = 32
+
+    ## @brief lock of the raster cache shared by the tasks: file SuricatesAlgo.rasterCacheName and SuricatesAlgo.rasterCacheUsers
+    #
+    # the lock is taken before SuricatesAlgo.lock when both are needed
+    rasterCacheLock = threading.Lock()
+
+    ## @brief number of running tasks which read each cached raster (key: name of the raster), these rasters are not deleted by the cache
+    rasterCacheUsers = Counter()
+
+    ## @brief maximum size (bytes) of the rasters kept in memory by a task, the next rasters are written on disk
+    memLimit = 2 << 30
+
+    ## @brief maximum size (bytes) of a raster kept in memory, the larger rasters are written on disk
+    tmpMaxMem = 512 << 20
+
+    ## @brief minimal work (number of constraints x number of cells of the map) to compute the constraints in parallel
+    #
+    # under this size, the creation of the threads costs more than the parallel computation: the constraints are computed one after the other.
+    # The value (4 Mega cells by default) may be tuned depending on the hardware.
+    PARALLEL_PIXEL_THRESHOLD = 1<<22
+
+    ## @brief delay (seconds) between two checks of the cancellation and of the progress while the constraints are computed in parallel
+    POLL_DELAY = 0.2
+
     ## @brief constructor of the task
     # @param constraints list of constraints (ConstraintItem)
     # @param suricatesInstance current SuricatesInstance
@@ -248,15 +382,24 @@ class SuricatesAlgo(QgsTask):
         Debug.begin("SuricatesAlgo::__init__")
         super().__init__(projectName, QgsTask.CanCancel)
         self.constraints = constraints
-        self.createdFiles = list()
+        self.createdFiles = set()
         self.suricatesInstance = suricatesInstance
         self.projectName = projectName
 
         self.counter = 0
+        self.lock = threading.Lock()
         self.date = QDate.currentDate().toString("yyMMdd")
         self.time = QTime.currentTime().toString("hhmmss")
+        self.token = QUuid.createUuid().toString(QUuid.Id128)[:8]
         self.createTmpPath()
         self.deleteTmp = False
+        self.useGdalProximity = not hasNumba
+        self.memoryUsed = 0
+        self.keepInMemory = True
+        self.outputs = dict()
+        self.progressEvents = queue.Queue()
+        self.taskThread = None
+        self.loadRasterCache()
         Debug.end("SuricatesAlgo::__init__")
         return;
 
@@ -280,33 +423,37 @@ class SuricatesAlgo(QgsTask):
     # @note the *.shp* files are associated to others files which have the same base name but not the same extension: These file are also removed.
     def deleteTmpFile(self):
         Debug.begin("SuricatesAlgo::deleteTmpFile")
-        for filename in self.createdFiles:
-            info = QFileInfo(filename)
-            base = info.baseName()
-            dir = QDir(info.absolutePath())
+        self.releaseMemoryFiles()
+        SuricatesAlgo.deleteFiles(self.createdFiles)
+        self.createdFiles = set()
+        Debug.end("SuricatesAlgo::deleteTmpFile")
+        return
 
-            filter = list()
-            filter.append(base + '.*')
+    ## @brief delete files on disk and their associated files (same base name, other extension)
+    # @param filenames names of the files to delete
+    @staticmethod
+    def deleteFiles(filenames):
+        # group the filters by folder: each folder is listed once
+        filters = dict()
+        for filename in filenames:
+            info = QFileInfo(filename)
+            filters.setdefault(info.absolutePath(), list()).append(info.baseName() + '.*')
 
+        for path, filter in filters.items():
+            dir = QDir(path)
             dir.setNameFilters(filter);
             dir.setFilter(QDir.Files | QDir.NoDotAndDotDot | QDir.NoSymLinks);
 
-            fileList = dir.entryInfoList();
-            for i in fileList:
-                if i.exists():
-                    Debug.print("delete " + i.absoluteFilePath())
-                    QFile.remove(i.absoluteFilePath())
-                    
-        self.createdFiles = list()
-        Debug.begin("SuricatesAlgo::deleteTmpFile")
-        return
+            for i in dir.entryInfoList():
+                Debug.print("delete " + i.absoluteFilePath())
+                QFile.remove(i.absoluteFilePath())
     
     ## @brief delete temporary path
     def deleteAllTmpFile(self):
         Debug.begin("SuricatesAlgo::deleteAllTmpFile")
         QDir(self.tmpPath).removeRecursively()
         self.createTmpPath()
-        Debug.begin("SuricatesAlgo::deleteAllTmpFile")
+        Debug.end("SuricatesAlgo::deleteAllTmpFile")
         return
 
     ## @brief get the main extent of a project as String.
@@ -316,58 +463,161 @@ class SuricatesAlgo(QgsTask):
     # @param layerName name of the layer
     # @return the extent formated string: `xMin, xMax, yMin, yMax [CRS]`
     def setExtentString(self, layerName):
-        rlayer = QgsVectorLayer(layerName, "tmp")
-        if(not rlayer.isValid()):
-           rlayer = QgsRasterLayer(layerName, "tmp")
+        # the provider is chosen with the extension: a raster isn't parsed by the vector provider first
+        extension = os.path.splitext(layerName.split('|')[0])[1].lower()
+        loader = SuricatesAlgo.layerLoaders.get(extension)
+        if(loader != None):
+            rlayer = loader(layerName, "tmp")
+        else:
+            rlayer = QgsVectorLayer(layerName, "tmp")
+            if(not rlayer.isValid()):
+               rlayer = QgsRasterLayer(layerName, "tmp")
 
         if(not rlayer.isValid()):
+           self.extentBounds = None
            self.extent = None
-        else: self.extent = str(rlayer.extent().xMinimum()-100) + ',' + str(rlayer.extent().xMaximum()+100) + ',' + str(rlayer.extent().yMaximum()-100)	 + ',' + str(rlayer.extent().yMinimum()+100) + ' [' + rlayer.crs().authid() + ']'
+        else:
+            extent = rlayer.extent()
+            # the y bounds are ordered as QGIS reads the historical string `xMin-100, xMax+100, yMax-100, yMin+100`
+            yBounds = (extent.yMaximum()-100, extent.yMinimum()+100)
+            self.extentBounds = (extent.xMinimum()-100, extent.xMaximum()+100, min(yBounds), max(yBounds), rlayer.crs().authid())
+            self.extent = '{},{},{},{} [{}]'.format(*self.extentBounds)
         return self.extent
 
     ## @brief create a random name for temporary file
     # @param extension of the file (example: .sdat, .tif)
+    # @param inMemory create the file in memory (MEMORY_PATH) instead of the temporary path
     # @return a filename
     #
     # this is also used to count and display progress of the task
     #
-    def getNewFileName(self, extension):
-        self.counter = self.counter + 1
-        self.setProgress(100.0 * float(self.counter) / (self.maxprogress+1))
-        filename = QDir(self.tmpPath).filePath('{}-{}{:02d}-{}{}'.format(self.date, self.time, self.counter, QUuid.createUuid().toString(), extension))
-        self.createdFiles.append(filename)
+    # @note a file in memory must be written and read by GDAL in this process (not by a processing algorithm)
+    def getNewFileName(self, extension, inMemory = False):
+        with self.lock:
+            self.counter = self.counter + 1
+            counter = self.counter
+            basename = f'{self.date}-{self.time}-{self.token}{self.counter:02d}{extension}'
+            if inMemory: filename = MEMORY_PATH + basename
+            else: filename = QDir(self.tmpPath).filePath(basename)
+            self.createdFiles.add(filename)
+        self.reportProgress(counter)
         return filename
 
+    ## @brief report the progress of the task
+    # @param counter number of temporary files created (see SuricatesAlgo.counter)
+    #
+    # the progress of a worker thread is queued: it is displayed by the thread of the task (see SuricatesAlgo.updateProgress)
+    def reportProgress(self, counter):
+        if threading.get_ident() == self.taskThread: self.setProgress(100.0 * float(counter) / (self.maxprogress+1))
+        else: self.progressEvents.put(counter)
+
+    ## @brief display the progress queued by the worker threads
+    def updateProgress(self):
+        counter = None
+        while not self.progressEvents.empty():
+            counter = max(counter or 0, self.progressEvents.get_nowait())
+        if counter != None: self.setProgress(100.0 * float(counter) / (self.maxprogress+1))
+
+    ## @brief reserve memory for a temporary raster kept in memory
+    # @param size estimated size of the file (bytes)
+    # @return True if the file can be kept in memory, False if it must be written on disk
+    # (memory disabled by SuricatesAlgo.keepInMemory, file larger than SuricatesAlgo.tmpMaxMem or SuricatesAlgo.memLimit reached)
+    def reserveMemory(self, size):
+        if not self.keepInMemory or size > SuricatesAlgo.tmpMaxMem: return False
+        with self.lock:
+            if self.memoryUsed + size > SuricatesAlgo.memLimit: return False
+            self.memoryUsed += size
+            return True
+
+    ## @brief release temporary files kept in memory
+    # @param filenames files to release (default: all the files in memory created during the task)
+    def releaseMemoryFiles(self, filenames = None):
+        with self.lock:
+            if filenames == None: filenames = self.createdFiles
+            for filename in [f for f in filenames if isMemoryFile(f)]:
+                stat = gdal.VSIStatL(filename)
+                if stat != None: self.memoryUsed = max(0, self.memoryUsed - stat.size)
+                gdal.Unlink(filename)
+                self.createdFiles.discard(filename)
+
     ## @brief create a new vector layer with buffer from a vector layer
-    # @param vectorName name of the input vector file
+    # @param vectorName name of the input vector file (example: `file.shp`, `file.gpkg|layername=layer`)
     # @param outputName name of the output vector file
     # @param distance distance around the area delimited by the vector layer
     # @return the name of the output raster file
     # @note return value may be different from the property *outputName* if the value of *outputName* is None
+    #
+    # the buffer is computed with OGR (same parameters as *native:buffer*: 5 segments, round caps and joins).
+    # The algorithm *native:buffer* is used if the layer can't be opened by OGR.
     def bufferVector(self, vectorName, outputName, distance):
         Debug.begin("SuricatesAlgo:bufferVector")
         if(outputName == None) : outputName = self.getNewFileName('.shp')
-        result = processing.run("native:buffer", {'INPUT': vectorName,
-                'DISTANCE': distance,
-                'SEGMENTS': 5,
-                'DISSOLVE': False,
-                'END_CAP_STYLE': 0,
-                'JOIN_STYLE': 0,
-                'MITER_LIMIT': 2,
-                'OUTPUT': outputName})
+
+        path, _, options = vectorName.partition('|')
+        source = ogr.Open(path)
+        if source != None:
+            layerName = options.partition('layername=')[2].split('|')[0]
+            inputLayer = source.GetLayerByName(layerName) if layerName else source.GetLayer(0)
+
+            output = ogr.GetDriverByName('ESRI Shapefile').CreateDataSource(outputName)
+            outputLayer = output.CreateLayer(QFileInfo(outputName).baseName(), inputLayer.GetSpatialRef(), ogr.wkbPolygon)
+            definition = outputLayer.GetLayerDefn()
+            for feature in inputLayer:
+                geometry = feature.GetGeometryRef()
+                if geometry == None: continue
+                outputFeature = ogr.Feature(definition)
+                outputFeature.SetGeometry(geometry.Buffer(distance, 5))
+                outputLayer.CreateFeature(outputFeature)
+            # the file is closed (and completed) when the datasource is released
+            output = None
+            source = None
+        else:
+            processing.run("native:buffer", {'INPUT': vectorName,
+                    'DISTANCE': distance,
+                    'SEGMENTS': 5,
+                    'DISSOLVE': False,
+                    'END_CAP_STYLE': 0,
+                    'JOIN_STYLE': 0,
+                    'MITER_LIMIT': 2,
+                    'OUTPUT': outputName})
         print('bufferVector ' + outputName)
         Debug.end("SuricatesAlgo:bufferVector")
         return outputName
 
     ## @brief rasterize vector layer
-    # @param vectorName name of the input vector file
+    # @param vectorName name of the input vector file (example: `file.shp`, `file.gpkg|layername=layer`)
     # @param outputName name of the output raster file
     # @return the name of the output raster file
     # @note return value may be different from the property *outputName* if the value of *outputName* is `TEMPORARY_OUTPUT` or None
+    #
+    # the layer is rasterized by GDAL in this process (same parameters as *gdal:rasterize*: resolution 100, burn 0), by strips of rows in parallel (see rasterizeLayer).
+    # The algorithm *gdal:rasterize* is used if the layer can't be opened by GDAL or if its CRS isn't the one of the extent (it reprojects the extent).
     def rasterize(self, vectorName, outputName):
         if(outputName == None) : outputName = self.getNewFileName('.tif')
+
+        path, _, options = vectorName.partition('|')
+        layerName = options.partition('layername=')[2].split('|')[0]
+        source = gdal.OpenEx(path, gdal.OF_VECTOR)
+        if source != None and self.extentBounds != None:
+            layer = source.GetLayerByName(layerName) if layerName else source.GetLayer(0)
+            srs = layer.GetSpatialRef() if layer != None else None
+            if srs != None and srs.GetAuthorityName(None) != None:
+                authid = srs.GetAuthorityName(None) + ':' + srs.GetAuthorityCode(None)
+                xMin, xMax, yMin, yMax, crs = self.extentBounds
+                if authid == crs:
+                    # the rasterized layer is a mask: Byte (MASK_TYPE) is enough
+                    layerName = layer.GetName()
+                    source = None
+                    # the strips are parallel only in the thread of the task: the constraints are already computed in parallel
+                    workers = SuricatesAlgo.maxWorkers if threading.get_ident() == self.taskThread else 1
+                    rasterizeLayer(outputName, path, layerName, (xMin, yMin, xMax, yMax), 100, workers)
+                    print('rasterize ' + outputName)
+                    return outputName
+        source = None
+
+        # the rasterized layer is a mask: Byte (MASK_TYPE) is enough
         result = processing.run("gdal:rasterize", { 'BURN' : 0,
-                'DATA_TYPE' : 5,
+                'DATA_TYPE' : 0,
                 'EXTENT' : self.extent,
                 'EXTRA' : '',
                 'FIELD' : None,
@@ -375,7 +625,7 @@ class SuricatesAlgo(QgsTask):
                 'INIT' : None,
                 'INPUT' : vectorName,
                 'INVERT' : False,
-                'NODATA' : -9999,
+                'NODATA' : MASK_NODATA,
                 'OPTIONS' : '',
                 'OUTPUT' : outputName,
                 'UNITS' : 1,
@@ -404,268 +654,190 @@ class SuricatesAlgo(QgsTask):
             Debug.end("SuricatesAlgo:rasterizeWithBuffer (2)")
             return r
 
-    ## @brief proximity vector layer
-    # @param rasterName name of the input raster file
-    # @param outputName name of the output raster file
-    # @return the name of the output raster file
-    def proximity(self, rasterName, outputName):
-        if(outputName == None) : outputName = self.getNewFileName('.tif')
-        result = processing.run("gdal:proximity", { 'BAND' : 1,
-              'DATA_TYPE' : 5,
-              'EXTRA' : '',
-              'INPUT' : rasterName,
-              'MAX_DISTANCE' : 0,
-              'NODATA' : -9999,
-              'OPTIONS' : '',
-              'OUTPUT' : outputName,
-              'REPLACE' : 0,
-              'UNITS' : 1,
-              'VALUES' : '0, 1' })
-        print('proximity ' + result['OUTPUT']);
-        return result['OUTPUT']
-
-    ## @brief clip a raster layer
-    # @param rasterName name of the input raster file
-    # @param clipRasterName name of the input raster file used to clip
-    # @param outputName name of the output raster file
-    # @return the name of the output raster file
-    def clip(self, rasterName, clipRasterName, outputName):
-        if(outputName == None) : outputName = self.getNewFileName('.tif')
-        print("clip-start" + rasterName + " " + clipRasterName + " " + outputName)
-        result = processing.run("gdal:rastercalculator", { 'BAND_A' : 1, 'BAND_B' : 1, 'BAND_C' : -1, 'BAND_D' : -1, 'BAND_E' : -1, 'BAND_F' : -1,
-                'EXTRA' : '',
-                'FORMULA' : 'B',
-                'INPUT_A' : clipRasterName,
-                'INPUT_B' : rasterName,
-                'INPUT_C' : None, 'INPUT_D' : None, 'INPUT_E' : None, 'INPUT_F' : None,
-                'NO_DATA' : -9999,
-                'OPTIONS' : '',
-                'OUTPUT' : outputName,
-                'RTYPE' : 5 })
-        print('clip ' + result['OUTPUT']);
-        return result['OUTPUT']
-
-    ## @brief invert data/nodata cells of a	 raster layer
-    # @param rasterName name of the input raster file
-    # @param outputName name of the output raster file
-    # @return the name of the output raster file
-    def invert(self, rasterName, outputName):
-        tmpName = self.getNewFileName('.sdat')
-        if(outputName == None) : outputName = self.getNewFileName('.tif')
-        result = processing.run('saga:invertdatanodata', { 'INPUT': rasterName, 'OUTPUT' : tmpName } )
-        print('invert ' + result['OUTPUT']);
-        return self.convertSagaOutput( result['OUTPUT'], outputName )
-
-    ## @brief convert sdat raster layer to tif
-    # @param rasterName name of the input raster file
-    # @param outputName name of the output raster file
-    # @return the name of the output raster file
-    def convertSagaOutput(self, rasterName, outputName):
-        if(outputName == None) : outputName = self.getNewFileName('.tif')
-        result = processing.run("gdal:translate", { 'COPY_SUBDATASETS' : False,
-                'DATA_TYPE' : 6,
-                'EXTRA' : '',
-                'INPUT' : rasterName,
-                'NODATA' : -9999,
-                'OPTIONS' : '',
-                'OUTPUT' : outputName,
-                'TARGET_CRS' : None } )
-        print('convertSagaOutput' + result['OUTPUT']);
-        return result['OUTPUT']
-
-    ## @brief merge two raster layer (complete no-data celles by the values of the second raster)
-    # @param rasterName1 name of the input raster file
-    # @param rasterName2 name of the input raster file to merge
-    # @param outputName name of the output raster file
-    # @return the name of the output raster file
-    def mergeLayers(self, rasterName1, rasterName2, outputName):
-        if(outputName == None) : outputName = self.getNewFileName('.tif')
-        result = processing.run("gdal:merge", { 'DATA_TYPE' : 5, 'EXTRA' : '',
-                'INPUT' : [rasterName1,rasterName2],
-                'NODATA_INPUT' : -9999,
-                'NODATA_OUTPUT' : -9999,
-                'OPTIONS' : '',
-                'OUTPUT' : outputName,
-                'PCT' : False,
-                'SEPARATE' : False } )
-        print('mergeLayers' + result['OUTPUT']);
-        return result['OUTPUT']
+    ## @brief load the rasterized layers of the previous tasks of the project
+    #
+    # the cache is a file of the temporary path, next to the rasters it references
+    def loadRasterCache(self):
+        self.rasterCacheName = QDir(self.tmpPath).filePath('.suricates_cache.json')
+        self.pinnedRasters = list()
+        with SuricatesAlgo.rasterCacheLock:
+            self.rasterCache = self.readRasterCache()
+
+    ## @brief read the file of the raster cache
+    # @return the rasterized layers registred in the file (empty if the file doesn't exist)
+    def readRasterCache(self):
+        try:
+            with open(self.rasterCacheName, 'r') as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return dict()
+
+    ## @brief save the rasterized layers for the next tasks of the project
+    #
+    # the file is read again and merged: the layers registred by the tasks which ended since the start of this one are kept.
+    # The layers which doesn't exist anymore (example: removed temporary files) are forgotten.
+    # The cache keeps the SuricatesAlgo.rasterCacheSize layers used last: the files of the older ones are deleted.
+    # If the temporary files are deleted (SuricatesAlgo.deleteTmp), the cached layers are temporary files too: the cache is emptied.
+    # The layers read by other running tasks (SuricatesAlgo.rasterCacheUsers) are never deleted.
+    def saveRasterCache(self):
+        # the file is also locked against the other QGIS processes which open the project
+        lockFile = QLockFile(self.rasterCacheName + '.lock')
+        with SuricatesAlgo.rasterCacheLock:
+            locked = lockFile.lock()
+            try:
+                # this task doesn't read its rasters anymore
+                users = SuricatesAlgo.rasterCacheUsers
+                for name in self.pinnedRasters:
+                    users[name] -= 1
+                    if users[name] <= 0: del users[name]
+                self.pinnedRasters = list()
+
+                # the dictionary is ordered from the least to the most recently used layer: the layers of this task are the most recent
+                cache = self.readRasterCache()
+                for key, name in self.rasterCache.items():
+                    cache.pop(key, None)
+                    cache[key] = name
+                entries = [(key, name) for key, name in cache.items() if os.path.exists(name)]
+                evictable = [(key, name) for key, name in entries if not name in users]
+                if not self.deleteTmp: evictable = evictable[:max(0, len(entries) - SuricatesAlgo.rasterCacheSize)]
+                evicted = {key for key, name in evictable}
+                self.rasterCache = {key: name for key, name in entries if not key in evicted}
+                SuricatesAlgo.deleteFiles(name for key, name in evictable)
+                try:
+                    with open(self.rasterCacheName, 'w') as file:
+                        json.dump(self.rasterCache, file)
+                except OSError:
+                    print('saveRasterCache: cannot write ' + self.rasterCacheName)
+            finally:
+                if locked: lockFile.unlock()
+
+    ## @brief key of a rasterized layer in the cache
+    # @param vectorName name of the input vector file
+    # @param buffer size of the buffer
+    # @return the key: name, modification time and size of the file, buffer and extent; None if the file doesn't exist
+    def rasterCacheKey(self, vectorName, buffer):
+        try:
+            stat = os.stat(vectorName.split('|')[0])
+        except OSError:
+            return None
+        return json.dumps([vectorName, stat.st_mtime, stat.st_size, buffer, self.extent])
 
-    ## @brief normalize raster between min and max
-    # @param rasterName name of the input raster file
-    # @param outputName name of the output raster file
-    # @param invert invert min (0) and max (coef)
-    # @param coef maximum value
+    ## @brief rasterize the layer of a constraint with buffer, use the raster of a previous task if the layer didn't change
+    # @param vectorName name of the input vector file
+    # @param buffer size of the buffer
     # @return the name of the output raster file
-    def normalizeRaster(self, rasterName, outputName, invert, coef):
-        if(outputName == None) : outputName = self.getNewFileName('.tif')
-
-        layer = QgsRasterLayer(rasterName, "tmp")
-        if(not layer.isValid()):
-           return None
-
-        provider = layer.dataProvider()
-
-        stats = provider.bandStatistics(1, QgsRasterBandStats.All, layer.extent(), 0)
-        min = stats.minimumValue
-        max = stats.maximumValue
-        print("s" + str(min) + " " + str(max))
-        if max-min == 0:
-            if min != 0: min = 0
-            else: max = 1
-        print("e" + str(min) + " " + str(max))
-
-        formula = '(A-{})/({}-{})'.format(min,max,min)
-        if(invert): formula = '1-' + formula
-        formula = '(' + formula + ')*' + str(coef)
-
-        result = processing.run("gdal:rastercalculator", { 'BAND_A' : 1, 'BAND_B' : 1, 'BAND_C' : -1, 'BAND_D' : -1, 'BAND_E' : -1, 'BAND_F' : -1,
-                'EXTRA' : '',
-                'FORMULA' : formula,
-                'INPUT_A' : rasterName,
-                'INPUT_B' : None,'INPUT_C' : None, 'INPUT_D' : None, 'INPUT_E' : None, 'INPUT_F' : None,
-                'NO_DATA' : -9999,
-                'OPTIONS' : '',
-                'OUTPUT' : outputName,
-                'RTYPE' : 5 })
-        print('normalizeRaster ' + result['OUTPUT']);
-        return result['OUTPUT']
+    #
+    # the rasters in the cache are not temporary files of the task: they are kept until they are evicted from the cache or the user deletes the temporary files (see SuricatesAlgo.saveRasterCache)
+    def rasterizeConstraint(self, vectorName, buffer):
+        key = self.rasterCacheKey(vectorName, buffer)
+        with SuricatesAlgo.rasterCacheLock:
+            cached = self.rasterCache.pop(key, None) if key != None else None
+            if cached != None and os.path.exists(cached):
+                # a used layer becomes the most recent of the cache, it isn't deleted by the other tasks while this one reads it
+                self.rasterCache[key] = cached
+                self.pinRaster(cached)
+            else:
+                cached = None
+        if cached != None:
+            print('rasterizeConstraint (cache) ' + cached)
+            return cached
+
+        rasterName = self.rasterizeWithBuffer(vectorName, None, buffer, False)
+        if key != None:
+            with SuricatesAlgo.rasterCacheLock, self.lock:
+                self.createdFiles.discard(rasterName)
+                self.rasterCache[key] = rasterName
+                self.pinRaster(rasterName)
+        return rasterName
+
+    ## @brief register a cached raster read by the task (SuricatesAlgo.rasterCacheLock must be held)
+    # @param rasterName name of the raster file
+    #
+    # the raster isn't deleted by the cache until the task saves the cache (see SuricatesAlgo.saveRasterCache)
+    def pinRaster(self, rasterName):
+        SuricatesAlgo.rasterCacheUsers[rasterName] += 1
+        self.pinnedRasters.append(rasterName)
 
-    ## @brief binarize raster using threashold
+    ## @brief proximity vector layer
     # @param rasterName name of the input raster file
     # @param outputName name of the output raster file
-    # @param coef threshold value
     # @return the name of the output raster file
-    def thresholdRaster(self, rasterName, outputName, coef):
+    #
+    # the distances are computed by the proximity algorithm of GDAL (used if SuricatesAlgo.useGdalProximity is True,
+    # the distance transform in memory is called by SuricatesAlgo.calculateTheConstraintOfProximity)
+    def proximity(self, rasterName, outputName):
         if(outputName == None) : outputName = self.getNewFileName('.tif')
 
-        formula = '(A<{0})*A+(A>={1})*-9999'
-        print("formula")
-        print(formula)
-        print(coef)
-        formula = formula.format(coef,coef)
-        print(formula)
-
-        result = processing.run("gdal:rastercalculator", { 'BAND_A' : 1, 'BAND_B' : 1, 'BAND_C' : -1, 'BAND_D' : -1, 'BAND_E' : -1, 'BAND_F' : -1,
-                'EXTRA' : '',
-                'FORMULA' : formula,
-                'INPUT_A' : rasterName,
-                'INPUT_B' : None,'INPUT_C' : None, 'INPUT_D' : None, 'INPUT_E' : None, 'INPUT_F' : None,
-                'NO_DATA' : -9999,
-                'OPTIONS' : '',
-                'OUTPUT' : outputName,
-                'RTYPE' : 5 })
-        print('thresholdRaster ' + result['OUTPUT']);
-        return result['OUTPUT']
+        # gdal:proximity in this process: pixel units, no maximum distance, targets 0 and 1
+        source = gdal.Open(rasterName)
+        output = createLike(outputName, source)
+        gdal.ComputeProximity(source.GetRasterBand(1), output.GetRasterBand(1), ['VALUES=0,1', 'DISTUNITS=PIXEL', 'NODATA=' + str(NODATA)])
+        output = None
+        source = None
+        print('proximity ' + outputName);
+        return outputName
 
     ## @brief calculate constraints with proximity
-    # @param layerName : rasterized layer where data cells are the source of the distance calculation and the no-data cells are the area to fill with distance value
-    # @param invertedLayerName: same as layerName but invert no-data and data
-    # @param mapName: rasterized layer which keep where data cells corresponds to the global area to fill
-    # @param outputName: output rasterized data
+    # @param output array of the constraint (float32): the cells of region are set
+    # @param region boolean array of the cells to fill with distance value (data cells of the map in the considered area)
+    # @param targets boolean array of the cells which are the source of the distance calculation
+    # @param like RasterBand which gives the georeferencing (used by the algorithm *gdal:proximity*)
     # @param invert: if False then near cells use the minimum value; if True then near cells use the maximum value
     # @param coef: coef to apply at the output raster
-    # @return the name of the output raster file
-    def calculateTheConstraintOfProximity(self, layerName, invertedLayerName, mapName, outputName, invert, coef):
-        RasterProximity = self.proximity(layerName, None)
-        RasterProximityClip1 = self.clip(RasterProximity,mapName,None)
-        RasterProximityClip2 = self.clip(RasterProximityClip1,invertedLayerName,None)
-        return self.normalizeRaster(RasterProximityClip2, None, invert, coef)
+    #
+    # the distance, the clipping by region and the normalization are done in memory
+    def calculateTheConstraintOfProximity(self, output, region, targets, like, invert, coef):
+        if not self.useGdalProximity:
+            # the threads of numba are used only by the thread of the task: the worker threads already compute the constraints in parallel
+            distances = proximityArray(targets, threading.get_ident() == self.taskThread)
+        else:
+            # the proximity of GDAL reads and writes datasets: they are kept in memory if possible
+            targetsName = writeBand(self.getNewFileName('.tif', self.reserveMemory(targets.size * np.dtype(MASK_TYPE).itemsize)), np.where(targets, MASK_TYPE(1), MASK_TYPE(MASK_NODATA)), like, MASK_NODATA)
+            distancesName = self.proximity(targetsName, self.getNewFileName('.tif', self.reserveMemory(targets.size * np.dtype(RASTER_TYPE).itemsize)))
+            distances = readBand(distancesName).array
+            self.releaseMemoryFiles([targetsName, distancesName])
 
+        values = normalizeArray(distances, region & (distances != NODATA), invert, coef)
+        np.copyto(output, values, where=region)
+        print('calculateTheConstraintOfProximity')
 
     ## @brief calculate constraints with constant
-    # @param layerName rasterized input layer
-    # @param mapName rasterized layer which keep where data cells corresponds to the global area to fill
-    # @param outputName output rasterized data
+    # @param output array of the constraint (float32): the cells of region are set
+    # @param region boolean array of the cells to fill (data cells of the map in the considered area)
     # @param coef value of the raster layer
-    # @return the name of the output raster file
-    def calculateTheConstraintWithConstant(self, layerName, mapName, outputName, coef):
-        if(outputName == None) : outputName = self.getNewFileName('.tif')
-        result = processing.run("gdal:rastercalculator", { 'BAND_A' : 1, 'BAND_B' : 1, 'BAND_C' : -1, 'BAND_D' : -1, 'BAND_E' : -1, 'BAND_F' : -1,
-                'EXTRA' : '',
-                'FORMULA' : str(coef),
-                'INPUT_A' : layerName,
-                'INPUT_B' : mapName,
-                'INPUT_C' : None, 'INPUT_D' : None, 'INPUT_E' : None, 'INPUT_F' : None,
-                'NO_DATA' : -9999,
-                'OPTIONS' : '',
-                'OUTPUT' : outputName,
-                'RTYPE' : 5 })
-        print('calculateTheConstraintWithConstant ' + result['OUTPUT']);
-        return result['OUTPUT']
+    def calculateTheConstraintWithConstant(self, output, region, coef):
+        np.copyto(output, RASTER_TYPE(coef), where=region)
+        print('calculateTheConstraintWithConstant')
 
-    ## @brief cumulate values of raster layers
+    ## @brief cumulate values of raster layers, normalize and threshold the cumulation
     # @param listLayerName rasterized layers to merge
-    # @param outputName output rasterized data
-    # @return the name of the output raster file
-    def cummulateLayers(self, listLayerName, outputName):
-        Debug.begin("SuricateAlgo::cummulateLayers (nb layer:" + str(len(listLayerName)) + ")")
-        count = len(listLayerName)
-
-        if(count == 0):
-            Debug.end("SuricateAlgo::cummulateLayers (1)")
-            return None;
-
-        baseLayer = listLayerName[0]
-        result = None
-        for i in range(1, count, 5):
-            A = baseLayer
-            print('cummulateLayers-A ' + A)
-            B = C = D = E = F = G = None
-            formula = 'A'
-            if(i < count):
-                B = listLayerName[i]
-                formula += '+B'
-                print('cummulateLayers-B ' + B)
-            if(i+1 < count):
-                C = listLayerName[i+1]
-                formula += '+C'
-                print('cummulateLayers-C ' + C)
-            if(i+2 < count):
-                D = listLayerName[i+2]
-                formula += '+D'
-                print('cummulateLayers-D ' + D)
-            if(i+3 < count):
-                E = listLayerName[i+3]
-                formula += '+E'
-                print('cummulateLayers-E ' + E)
-            if(i+4 < count):
-                F = listLayerName[i+4]
-                formula += '+F'
-                print('cummulateLayers-F ' + F)
-
-            if(i+5 < count or outputName == None): tmp = self.getNewFileName('.tif')
-            else: tmp = outputName
-            result = processing.run("gdal:rastercalculator", { 'BAND_A' : 1, 'BAND_B' : 1, 'BAND_C' : 1, 'BAND_D' : 1, 'BAND_E' : 1, 'BAND_F' : 1,
-                    'EXTRA' : '',
-                    'FORMULA' : formula,
-                    'INPUT_A' : A, 'INPUT_B' : B,'INPUT_C' : C, 'INPUT_D' : D, 'INPUT_E' : E, 'INPUT_F' : F,
-                    'NO_DATA' : -9999,
-                    'OPTIONS' : '',
-                    'OUTPUT' : tmp,
-                    'RTYPE' : 5 })
-            baseLayer = result['OUTPUT']
-            print('cummulateLayers-tmp:' + baseLayer)
-            print(formula)
-        print('cummulateLayers-result' + baseLayer)
-
-        Debug.end("SuricateAlgo::cummulateLayers (2)")
-        return baseLayer
+    # @param threshold threshold value (between 0 and 1)
+    # @return the name of the raster file of the normalized cumulation and the name of the thresholded raster file
+    #
+    # the sum, the normalization and the threshold are done in a single pass in memory (see finalizeBands)
+    def finalizeLayers(self, listLayerName, threshold):
+        Debug.begin("SuricateAlgo::finalizeLayers (nb layer:" + str(len(listLayerName)) + ")")
+        # the outputs are only written in the project folder by SuricatesAlgo.finished: they are kept in memory if possible
+        size = self.mapCells * np.dtype(RASTER_TYPE).itemsize
+        rasterName = self.getNewFileName('.tif', self.reserveMemory(size))
+        thresholdName = self.getNewFileName('.tif', self.reserveMemory(size))
+        finalizeBands(listLayerName, rasterName, thresholdName, threshold)
+        print('finalizeLayers ' + rasterName + ' ' + thresholdName)
+        Debug.end("SuricateAlgo::finalizeLayers")
+        return rasterName, thresholdName
 
     ## @brief calculate the number of layers to create the wished layer specific to the ContraintType
     # @param constraintType constraint type
     # @return the number of layers to create
     def calculateConstraintSteps(self, constraintType):
-        if constraintType == ConstraintType.Attractive or constraintType == ConstraintType.Repulsive:
-            return 4
-        if constraintType == ConstraintType.Included or constraintType == ConstraintType.Excluded:
-            return 1
-        return 0
+        if not self.useGdalProximity: return 0
+        return constraintSteps.get(constraintType, 0)
 
     ## @brief calculate the number of layers to create the list of constraint `self.constraints`
     # @return number of layer to create
     def calculateMaxProgress(self):
         self.maxprogress = 0
+        types = Counter() # number of use of each constraint type
         for constraint in self.constraints:
             if constraint.typeIn == ConstraintType.Sanctuarized and constraint.typeOut == ConstraintType.Sanctuarized:
                 continue
@@ -673,117 +845,184 @@ class SuricatesAlgo(QgsTask):
             # rasterizewithbuffer
             if(constraint.buffer == 0): self.maxprogress += 1
             else: self.maxprogress += 2
-            # invert
+            # raster of the constraint (inside and outside merged)
             if(constraint.typeIn != ConstraintType.Map):
-                self.maxprogress += 2
-
-            # specific computations
-            self.maxprogress += self.calculateConstraintSteps(constraint.typeIn)
-            self.maxprogress += self.calculateConstraintSteps(constraint.typeOut)
-
-            # merge layer
-            if constraint.typeIn != ConstraintType.Sanctuarized and constraint.typeOut != ConstraintType.Sanctuarized:
                 self.maxprogress += 1
 
-        # merge layers
-        for i in range(1, len(self.constraints), 5):
-            self.maxprogress += 1
+            types[constraint.typeIn] += 1
+            types[constraint.typeOut] += 1
+
+        # specific computations
+        self.maxprogress += sum(self.calculateConstraintSteps(type) * count for type, count in types.items())
 
-        # normalize & threadhols process
-        self.maxprogress += 1
+        # cumulation, normalization & threshold process (normalized and thresholded rasters)
+        self.maxprogress += 2
 
         return self.maxprogress
 
-    ## @brief create raster depending of the constraint type
+    ## @brief compute the cells of a constraint raster depending of the constraint type
     # @param constraintType the constraint type
     # @param priority max value of the output raster
-    # @param rasterMap raster layer which represents the global area
-    # @param rasterLayer raster layer which respresents zones to consider
-    # @param rasterLayer_1 inverse data/no-data of the rasterLayer
-    # @return the layer name created
-    def computeRaster(self, constraintType, priority, rasterMap, rasterLayer, rasterLayer_1):
-        if constraintType == ConstraintType.Repulsive:
-            return self.calculateTheConstraintOfProximity(rasterLayer, rasterLayer_1, rasterMap, None, True, priority)
-        if constraintType == ConstraintType.Attractive:
-            return self.calculateTheConstraintOfProximity(rasterLayer, rasterLayer_1, rasterMap, None, False, priority)
-        if constraintType == ConstraintType.Excluded:
-            return self.calculateTheConstraintWithConstant(rasterLayer_1,rasterMap,None,priority)
-        if constraintType == ConstraintType.Included:
-            return self.calculateTheConstraintWithConstant(rasterLayer_1,rasterMap,None,0)
-        return None
+    # @param output array of the constraint (float32): the cells of region are set
+    # @param region boolean array of the cells to consider (data cells of the map inside or outside the zones of the layer)
+    # @param targets boolean array of the cells outside region (the zones of the layer for the outside, their complement for the inside)
+    # @param like RasterBand which gives the georeferencing
+    def computeRaster(self, constraintType, priority, output, region, targets, like):
+        computation = SuricatesAlgo.rasterComputations.get(constraintType)
+        if computation != None: computation(self, output, region, targets, like, priority)
+
+    ## @brief computation of each constraint type used by SuricatesAlgo.computeRaster (the other types are no-data)
+    rasterComputations = {
+        ConstraintType.Repulsive: lambda self, output, region, targets, like, priority: self.calculateTheConstraintOfProximity(output, region, targets, like, True, priority),
+        ConstraintType.Attractive: lambda self, output, region, targets, like, priority: self.calculateTheConstraintOfProximity(output, region, targets, like, False, priority),
+        ConstraintType.Excluded: lambda self, output, region, targets, like, priority: self.calculateTheConstraintWithConstant(output, region, priority),
+        ConstraintType.Included: lambda self, output, region, targets, like, priority: self.calculateTheConstraintWithConstant(output, region, 0) }
+
+    ## @brief create the raster of a constraint: the inside and outside areas are computed in the same array
+    #
+    # this method is called in parallel for each constraint by SuricatesAlgo.run.
+    # The rasterized layer is read once, the inside, the outside and their merge are computed in memory and written once.
+    # The sanctuarized areas stay no-data.
+    # @param constraint the constraint to compute (ConstraintItem)
+    # @param mapValid boolean array of the data cells of the map (global area)
+    # @return the layer name created (None if the task is canceled)
+    #
+    # the cancellation is checked before each step (rasterization, computation, writing): a running constraint stops at the next step
+    def computeConstraint(self, constraint, mapValid):
+        if self.isCanceled(): return None
+        Debug.print("Operate " + constraint.name)
+        rasterLayer = self.rasterizeConstraint(constraint.name, constraint.buffer)
+        if self.isCanceled(): return None
+        layer = readBand(rasterLayer)
+        inside = layer.valid()
+        outside = ~inside
+
+        output = np.full(inside.shape, NODATA, dtype=RASTER_TYPE)
+        Debug.print("begin raster out")
+        self.computeRaster(constraint.typeOut, constraint.priority, output, mapValid & outside, inside, layer) # outside area
+        Debug.print("begin raster in")
+        self.computeRaster(constraint.typeIn, constraint.priority, output, mapValid & inside, outside, layer) # inside area
+        Debug.print("end")
+        if self.isCanceled(): return None
+
+        # the raster is read by the cumulation in this process: it is kept in memory if possible
+        outputlayer = writeBand(self.getNewFileName('.tif', self.reserveMemory(output.nbytes)), output, layer)
+        with self.lock:
+            self.createdFiles.discard(outputlayer)
+        return outputlayer
+
+    ## @brief pack the types of the constraints in arrays
+    #
+    # the arrays are indexed like `self.constraints`: the constraints are filtered without loop on the items
+    def packConstraints(self):
+        self.typesIn = np.array([constraint.typeIn.value for constraint in self.constraints], dtype=np.int8)
+        self.typesOut = np.array([constraint.typeOut.value for constraint in self.constraints], dtype=np.int8)
+        sanctuarized = ConstraintType.Sanctuarized.value
+        self.active = ((self.typesIn != sanctuarized) | (self.typesOut != sanctuarized)) & (self.typesIn != ConstraintType.Map.value)
+
+    ## @brief remove the rasters of a canceled task
+    # @param layers rasters of the constraints already computed (None for a constraint canceled before its computation)
+    def cleanCanceledRun(self, layers):
+        with self.lock:
+            self.createdFiles.update(layer for layer in layers if layer != None)
+        self.saveRasterCache()
+        self.releaseMemoryFiles()
+        if self.deleteTmp:
+            self.deleteTmpFile()
 
     ## @brief method used when task started: create raster which corresponds to the list of constraints
     # @return true if done
     def run(self):
         Debug.begin("SuricatesAlgo:run")
+        self.taskThread = threading.get_ident()
         
         self.calculateMaxProgress()
 
         rasterMap = None
         threshold = 0.5
         Debug.print("nb constraints:" + str(len(self.constraints)))
-        # search map
-        for constraint in self.constraints:
-            Debug.print("It is the map? " + constraint.name)
-            if constraint.typeIn == ConstraintType.Map:
-                rasterMap = self.rasterizeWithBuffer(constraint.name, None, constraint.buffer, True)
-                threshold = float(constraint.priority)/100.0
-                self.createdFiles.remove(rasterMap)
-                Debug.print("- Yes")
-                Debug.print("- result: " + rasterMap)
-                Debug.print("- threshold: " + str(threshold))
+        self.packConstraints()
+
+        # search map (the last one is used)
+        maps = np.flatnonzero(self.typesIn == ConstraintType.Map.value)
+        if len(maps) > 0:
+            constraint = self.constraints[maps[-1]]
+            Debug.print("The map is " + constraint.name)
+            rasterMap = self.rasterizeWithBuffer(constraint.name, None, constraint.buffer, True)
+            threshold = float(constraint.priority)/100.0
+            self.createdFiles.discard(rasterMap)
+            Debug.print("- result: " + rasterMap)
+            Debug.print("- threshold: " + str(threshold))
 
         if(rasterMap == None):
             Debug.end("SuricatesAlgo:run (error 1)")
             return False
 
-        layers = list() # list of layer to merge
-
         # for each constraint create raster layer
         self.outputs = dict()
 
-        for constraint in self.constraints:
-            Debug.print("Operate " + constraint.name)
+        # the constraints of the same types are computed one after the other
+        indices = np.flatnonzero(self.active)
+        indices = indices[np.lexsort((self.typesOut[indices], self.typesIn[indices]))]
+        constraints = [self.constraints[i] for i in indices] # list of constraints to compute
+        Debug.print("Skip " + str(len(self.constraints) - len(constraints)) + " constraints (map or sanctuarized)")
+
+        # the map is read once for all the constraints
+        mapValid = readBand(rasterMap).valid()
+        self.mapCells = mapValid.size
+
+        # the constraints are independent until the cumulation: they are computed in parallel if the work is large enough
+        results = dict() # output layer of each constraint (index in constraints)
+        # each worker holds the squared distances of the map in float64 and their float32 result: the workers are limited by SuricatesAlgo.memLimit
+        workers = max(1, min(SuricatesAlgo.maxWorkers, SuricatesAlgo.memLimit // (mapValid.size * 8 * 2)))
+        if workers > 1 and len(constraints) > 1 and len(constraints) * mapValid.size >= SuricatesAlgo.PARALLEL_PIXEL_THRESHOLD:
+            with ThreadPoolExecutor(max_workers=workers) as executor:
+                futures = {executor.submit(self.computeConstraint, constraint, mapValid): i for i, constraint in enumerate(constraints)}
+                pending = set(futures)
+                while pending and not self.isCanceled():
+                    done, pending = wait(pending, timeout=SuricatesAlgo.POLL_DELAY, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        i = futures[future]
+                        results[i] = future.result()
+                        Debug.print("Done " + constraints[i].name)
+                    self.updateProgress()
+                # the constraints not started are dropped, the running ones end before the executor
+                for future in pending: future.cancel()
+            # the rasters of the constraints which were running at the cancellation are removed with the others
+            for future, i in futures.items():
+                if not i in results and not future.cancelled() and future.exception() == None:
+                    results[i] = future.result()
+        else:
+            for i, constraint in enumerate(constraints):
+                if self.isCanceled(): break
+                results[i] = self.computeConstraint(constraint, mapValid)
+                Debug.print("Done " + constraint.name)
+
+        if self.isCanceled():
+            self.cleanCanceledRun(results.values())
+            Debug.end("SuricatesAlgo:run (canceled)")
+            return False
 
-            if constraint.typeIn == ConstraintType.Sanctuarized and constraint.typeOut == ConstraintType.Sanctuarized:
-                Debug.print("- Skip")
-                continue
-            if constraint.typeIn == ConstraintType.Map:
-                Debug.print("- Skip")
-                continue
+        # the layers are kept in the order of the computation: the cumulation doesn't depend on the end of the threads
+        layers = list() # list of layer to merge
+        for i, constraint in enumerate(constraints):
+            bn = QFileInfo(constraint.name).baseName()
+            self.outputs[bn] = results[i]
+            layers.append(results[i])
 
-            rasterLayer = self.rasterizeWithBuffer(constraint.name, None, constraint.buffer, False)
-            rasterLayer_1 = self.invert(rasterLayer, None)
-
-            print("begin raster out")
-            outside = self.computeRaster(constraint.typeOut, constraint.priority, rasterMap, rasterLayer, rasterLayer_1) # create layer for inside area
-            print("begin raster in")
-            inside = self.computeRaster(constraint.typeIn, constraint.priority, rasterMap, rasterLayer_1, rasterLayer) # create layer for outside area
-            print("end")
-            
-            if(inside == None):
-                outputlayer = outside
-            elif(outside == None):
-                outputlayer = inside
-            else:
-                outputlayer = self.mergeLayers(inside, outside, None)
+        self.saveRasterCache()
 
-            bn = QFileInfo(constraint.name).baseName()
-            self.outputs[bn] = outputlayer
-            layers.append(outputlayer)
-            
-            print("before remove" + str( len(self.createdFiles)))
-            self.createdFiles.remove(outputlayer)
-            print("before remove" + str( len(self.createdFiles)))
-            
-            if self.deleteTmp:
-                self.deleteTmpFile()
-            print("after remove" + str( len(self.createdFiles)))
-
-        rasterCumul = self.cummulateLayers(layers, None)
-        rasterCumulFinal = self.normalizeRaster(rasterCumul,None,False,1)
-        rasterCumulFinal2 = self.thresholdRaster(rasterCumulFinal, None, threshold)
+        # temporary files can't be deleted while other constraints are computed
+        self.releaseMemoryFiles()
+        if self.deleteTmp:
+            self.deleteTmpFile()
+        print("after remove" + str( len(self.createdFiles)))
 
+        if(len(layers) == 0):
+            Debug.end("SuricatesAlgo:run (error 2)")
+            return False
+
+        rasterCumulFinal, rasterCumulFinal2 = self.finalizeLayers(layers, threshold)
 
         self.outputs["raster"] = rasterCumulFinal
         self.outputs["threshold("+ str(threshold) + ")"] = rasterCumulFinal2
@@ -796,12 +1035,12 @@ class SuricatesAlgo(QgsTask):
     ## @param result is the return of the method Suricates.run
     ##
     ## - display a message to announce success or error during task;
-    ## - copy many temporary files (layer raster, normalized cumulation of raster and a thresholded version of this one;
+    ## - move many temporary files in the project folder (layer raster, normalized cumulation of raster and a thresholded version of this one), or copy them if they are on another device;
     ## - display a message bow which asks if temporary files must be removed;
     def finished(self,result):
         Debug.begin("SuricatesAlgo::finished")
-        if result: self.suricatesInstance.iface.messageBar().pushMessage("Success", "Rasters Created", level=Qgis.Success)
-        else: self.suricatesInstance.iface.messageBar().pushMessage("Error", "Rasters Creation failled", level=Qgis.Critical)
+        if result: self.suricatesInstance.messageBar.pushMessage("Success", "Rasters Created", level=Qgis.Success)
+        else: self.suricatesInstance.messageBar.pushMessage("Error", "Rasters Creation failled", level=Qgis.Critical)
 
         if result:
             root = self.suricatesInstance.getProject(self.projectName);
@@ -813,12 +1052,26 @@ class SuricatesAlgo(QgsTask):
 
                 filename3 = dir.filePath(name + "-" + filename2)
 
-                QFile.copy(filename, filename3)
+                # the file is moved if possible: a copy writes again the whole raster
+                if isMemoryFile(filename):
+                    gdal.Translate(filename3, filename, format='GTiff', creationOptions=TILED_OPTIONS)
+                elif os.stat(filename).st_dev == os.stat(dir.absolutePath()).st_dev:
+                    shutil.move(filename, filename3)
+                else:
+                    gdal.Translate(filename3, filename, format='GTiff', creationOptions=TILED_OPTIONS)
+
+                # the overviews are built once: the canvas doesn't read the full raster at each zoom
+                buildOverviews(filename3)
 
                 layer_shp = QgsRasterLayer(filename3, name)
                 QgsProject.instance().addMapLayer(layer_shp, False)
                 root.addLayer(layer_shp)
 
+        # the outputs kept in memory are saved now (or lost if the task failed)
+        for filename in self.outputs.values():
+            if isMemoryFile(filename): gdal.Unlink(filename)
+        self.releaseMemoryFiles()
+
         self.suricatesInstance.tasks.remove( self )
         
         #◙if self.deleteTmp:
@@ -826,6 +1079,44 @@ class SuricatesAlgo(QgsTask):
 
         Debug.end("SuricatesAlgo::finished")
 
+## @brief task which writes a vector layer in a shapefile
+#
+# the writing of a large layer takes time: it is done by the task manager of QGIS, the result is given to a function in the main thread.
+class VectorWriterTask(QgsTask):
+    ## @var layer
+    # layer to write (QgsVectorLayer), a copy owned by the task (example: materialized from a layer of the project): it must not be used by the interface during the task
+
+    ## @var fileName
+    # name of the output file (.shp)
+
+    ## @var onWritten
+    # function called in the main thread with VectorWriterTask.error at the end of the task
+
+    ## @var error
+    # result of QgsVectorFileWriter.writeAsVectorFormat (None if the task didn't write the file)
+
+    ## @brief constructor of the task
+    # @param layer layer to write (QgsVectorLayer)
+    # @param fileName name of the output file (.shp)
+    # @param onWritten function called in the main thread with the result of the writing
+    def __init__(self, layer, fileName, onWritten):
+        super().__init__("write " + QFileInfo(fileName).fileName(), QgsTask.CanCancel)
+        self.layer = layer
+        self.fileName = fileName
+        self.onWritten = onWritten
+        self.error = None
+
+    ## @brief write the file (thread of the task)
+    # @return true if done
+    def run(self):
+        self.error = QgsVectorFileWriter.writeAsVectorFormat(self.layer, self.fileName, "utf-8", driverName="ESRI Shapefile")
+        return self.error[0] == QgsVectorFileWriter.NoError
+
+    ## @brief executed when task is finished (main thread): give the result to the function onWritten
+    ## @param result is the return of the method VectorWriterTask.run
+    def finished(self, result):
+        self.onWritten(self.error)
+
 ## @brief widget which contains parameter interface for constrains configuration
 #
 # this interface contains:
@@ -851,35 +1142,14 @@ class ConstraintWidget(QWidget):
     ## @var w_buttonDel
     # QPushButton for deletion of the selected constrained layer
 
-    ## @var w_nearInRB
-    # QRadioButton for the 'Near' option for the 'Inside' area
-
-    ## @var w_farInRB
-    # QRadioButton for the 'Far' option for the 'Inside' area
-
-    ## @var w_inInRB
-    # QRadioButton for the 'In' option for the 'Inside' area
-
-    ## @var w_outInRB
-    # QRadioButton for the 'Out' option for the 'Inside' area
-
-    ## @var w_excludeInRB
-    # QRadioButton for the 'Exclude' option for the 'Inside' area
+    ## @var w_currentView
+    # QCheckBox to copy only the features of the current view of the map when a constrained layer is added
 
-    ## @var w_nearOutRB
-    # QRadioButton for the 'Near' option for the 'Outside' area
+    ## @var w_insideRB
+    # QRadioButton of each constraint type for the 'Inside' area, key: ConstraintType (see ConstraintWidget.radioButtonSpecs)
 
-    ## @var w_farOutRB
-    # QRadioButton for the 'Far' option for the 'Outside' area
-
-    ## @var w_inOutRB
-    # QRadioButton for the 'In' option for the 'Outside' area
-
-    ## @var w_outOutRB
-    # QRadioButton for the 'Out' option for the 'Outside' area
-
-    ## @var w_excludeOutRB
-    # QRadioButton for the 'Exclude' option for the 'Outside' area
+    ## @var w_outsideRB
+    # QRadioButton of each constraint type for the 'Outside' area, key: ConstraintType (see ConstraintWidget.radioButtonSpecs)
 
     ## @var w_buffer
     # QSpinBox for the buffer (distance around layer items)
@@ -900,6 +1170,13 @@ class ConstraintWidget(QWidget):
     ## @var currentProject
     # name of the current project (string)
 
+    ## @brief radio buttons of the constraint types for the inside and the outside areas: (type, label, tooltip), in the order of display
+    radioButtonSpecs = [(ConstraintType.Repulsive, "Repulsive", None),
+                        (ConstraintType.Attractive, "Attractive", None),
+                        (ConstraintType.Included, "Included", None),
+                        (ConstraintType.Excluded, "Excluded", "only applies to one selected layer whereas "),
+                        (ConstraintType.Sanctuarized, "Sanctuarized", "applies accross all project layers.")]
+
     ## @brief constructor of the widget
     # @param parent parent widget (QWidget)
     def __init__(self, parent=None):
@@ -915,6 +1192,9 @@ class ConstraintWidget(QWidget):
         selectl2.addWidget(self.w_buttonAdd)
         selectl2.addWidget(self.w_buttonDel)
         selectl.addLayout(selectl2)
+        self.w_currentView = QCheckBox("Copy only current view", self)
+        self.w_currentView.setToolTip("only the features visible in the map are copied in the new constrained layer")
+        selectl.addWidget(self.w_currentView)
 
         self.w_listConstraints	= QTreeWidget(self)
         self.w_listConstraints.setHeaderLabels(["Name","Inside","Outside", "Distance","Weight"])
@@ -926,34 +1206,8 @@ class ConstraintWidget(QWidget):
         groupc1 = QVBoxLayout()
         groupc2 = QVBoxLayout()
 
-        self.w_farInRB = QRadioButton("Repulsive",self)
-        self.w_nearInRB = QRadioButton("Attractive", self)
-        self.w_inInRB = QRadioButton("Included",self)
-        self.w_outInRB = QRadioButton("Excluded", self)
-        self.w_outInRB.setToolTip("only applies to one selected layer whereas ")
-        self.w_excludeInRB = QRadioButton("Sanctuarized", self)
-        self.w_excludeInRB.setToolTip("applies accross all project layers.")
-      
-        self.w_farOutRB = QRadioButton("Repulsive",self)
-        self.w_nearOutRB = QRadioButton("Attractive", self)
-        self.w_inOutRB = QRadioButton("Included",self)
-        self.w_outOutRB = QRadioButton("Excluded", self)
-        self.w_outOutRB.setToolTip("only applies to one selected layer whereas ")
-        self.w_excludeOutRB = QRadioButton("Sanctuarized", self)
-        self.w_excludeOutRB.setToolTip("applies accross all project layers.")
-
-        groupclw = QGroupBox("Inside the object")
-        groupc1.addWidget(self.w_farInRB)
-        groupc1.addWidget(self.w_nearInRB)
-        groupc1.addWidget(self.w_inInRB)
-        groupc1.addWidget(self.w_outInRB)
-        groupc1.addWidget(self.w_excludeInRB)
-
-        groupc2.addWidget(self.w_farOutRB)
-        groupc2.addWidget(self.w_nearOutRB)
-        groupc2.addWidget(self.w_inOutRB)
-        groupc2.addWidget(self.w_outOutRB)
-        groupc2.addWidget(self.w_excludeOutRB)
+        self.w_insideRB = self.createRadioButtons(groupc1)
+        self.w_outsideRB = self.createRadioButtons(groupc2)
 
         groupc1b = QGroupBox("Inside:")
         groupc1b.setToolTip("Contraint inside the object")
@@ -1012,6 +1266,31 @@ class ConstraintWidget(QWidget):
 
         Debug.end("ConstraintWidget::__init__")
 
+    ## @brief create a radio button for each constraint type (see ConstraintWidget.radioButtonSpecs)
+    # @param layout layout where the radio buttons are added
+    # @return the radio buttons, key: ConstraintType
+    def createRadioButtons(self, layout):
+        buttons = dict()
+        for constraintType, label, toolTip in ConstraintWidget.radioButtonSpecs:
+            button = QRadioButton(label, self)
+            if toolTip != None: button.setToolTip(toolTip)
+            layout.addWidget(button)
+            buttons[constraintType] = button
+        return buttons
+
+    ## @brief check the radio button of a constraint type
+    # @param buttons radio buttons, key: ConstraintType
+    # @param checkedType constraint type to check (None: no radio button is checked)
+    def setCheckedType(self, buttons, checkedType):
+        for constraintType, button in buttons.items():
+            button.setChecked(constraintType == checkedType)
+
+    ## @brief get the constraint type of the checked radio button
+    # @param buttons radio buttons, key: ConstraintType
+    # @return the constraint type (None if no radio button is checked)
+    def checkedType(self, buttons):
+        return next((constraintType for constraintType, button in buttons.items() if button.isChecked()), None)
+
     ## @brief set the current project and update the list of constraints
     # @param name of the current project
     def setProject(self, name):
@@ -1075,60 +1354,29 @@ class ConstraintWidget(QWidget):
             Debug.end("ConstraintWidget::updateOption (Error 2)")
             return;
 
-        constraintsList = self.suricates.getConstraintsFromConfig(project, configLayer)
+        # only the constraint of this name is built
+        constraintsList = self.suricates.getConstraintsFromConfig(project, configLayer, {name})
 
         current = None
         for constraint in constraintsList:
-            if constraint.name == name:
-                current = constraint
+            current = constraint
 
         if current == None:
-            setOptionEnabled(False)
+            self.setOptionEnabled(False)
             Debug.end("ConstraintWidget::updateOption (Error 3)")
             return;
 
         self.w_save.setEnabled(True)
 
         if current.typeIn == ConstraintType.Map:
-            self.w_nearInRB.setEnabled(False)
-            self.w_farInRB.setEnabled(False)
-            self.w_inInRB.setEnabled(False)
-            self.w_outInRB.setEnabled(False)
-            self.w_excludeInRB.setEnabled(False)
-            
-            self.w_nearInRB.setChecked(False)
-            self.w_farInRB.setChecked(False)
-            self.w_inInRB.setChecked(False)
-            self.w_outInRB.setChecked(False)
-            self.w_excludeInRB.setChecked(False)
-
-            self.w_nearOutRB.setEnabled(False)
-            self.w_farOutRB.setEnabled(False)
-            self.w_inOutRB.setEnabled(False)
-            self.w_outOutRB.setEnabled(False)
-            self.w_excludeOutRB.setEnabled(False)
-
-            self.w_nearOutRB.setChecked(False)
-            self.w_farOutRB.setChecked(False)
-            self.w_inOutRB.setChecked(False)
-            self.w_outOutRB.setChecked(False)
-            self.w_excludeOutRB.setChecked(False)
-
+            self.setOptionEnabled(False)
+            self.setCheckedType(self.w_insideRB, None)
+            self.setCheckedType(self.w_outsideRB, None)
             self.w_buffer.setEnabled(True)
-            self.w_priority.setEnabled(False)
         else:
             self.setOptionEnabled(True)
-            if current.typeIn == ConstraintType.Attractive: self.w_nearInRB.setChecked(True)
-            elif current.typeIn == ConstraintType.Repulsive: self.w_farInRB.setChecked(True)
-            elif current.typeIn == ConstraintType.Included: self.w_inInRB.setChecked(True)
-            elif current.typeIn == ConstraintType.Excluded: self.w_outInRB.setChecked(True)
-            elif current.typeIn == ConstraintType.Sanctuarized: self.w_excludeInRB.setChecked(True)
-
-            if current.typeOut == ConstraintType.Attractive: self.w_nearOutRB.setChecked(True)
-            elif current.typeOut == ConstraintType.Repulsive: self.w_farOutRB.setChecked(True)
-            elif current.typeOut == ConstraintType.Included: self.w_inOutRB.setChecked(True)
-            elif current.typeOut == ConstraintType.Excluded: self.w_outOutRB.setChecked(True)
-            elif current.typeOut == ConstraintType.Sanctuarized: self.w_excludeOutRB.setChecked(True)
+            self.setCheckedType(self.w_insideRB, current.typeIn)
+            self.setCheckedType(self.w_outsideRB, current.typeOut)
 
         self.w_buffer.setValue(current.buffer)
         self.w_priority.setValue(current.priority/10)
@@ -1137,23 +1385,13 @@ class ConstraintWidget(QWidget):
 
     ## @brief enable radiobuttons and fields of constraints configuration
     # @param enabled activate (or desactivate) the radiobox (contraints type) and spinbox (buffer ans priority)
+    @Debug.traced("ConstraintWidget::setOptionEnabled")
     def setOptionEnabled(self, enabled):
-        Debug.begin("ConstraintWidget::setOptionEnabled")
-        self.w_nearInRB.setEnabled(enabled)
-        self.w_farInRB.setEnabled(enabled)
-        self.w_inInRB.setEnabled(enabled)
-        self.w_outInRB.setEnabled(enabled)
-        self.w_excludeInRB.setEnabled(enabled)
-
-        self.w_nearOutRB.setEnabled(enabled)
-        self.w_farOutRB.setEnabled(enabled)
-        self.w_inOutRB.setEnabled(enabled)
-        self.w_outOutRB.setEnabled(enabled)
-        self.w_excludeOutRB.setEnabled(enabled)
+        for button in (*self.w_insideRB.values(), *self.w_outsideRB.values()):
+            button.setEnabled(enabled)
 
         self.w_buffer.setEnabled(enabled)
         self.w_priority.setEnabled(enabled)
-        Debug.end("ConstraintWidget::setOptionEnabled")
 
     ## get the configuration from name
     # @param name name of the constraint
@@ -1170,15 +1408,15 @@ class ConstraintWidget(QWidget):
             Debug.end("ConstraintWidget::getConstraintFromName (Error 2)")
             return;
 
-        constraintsList = self.suricates.getConstraintsFromConfig(project, configLayer)
+        # only the constraint of this name is built
+        constraintsList = self.suricates.getConstraintsFromConfig(project, configLayer, {name})
 
         current = None
         for constraint in constraintsList:
-            if constraint.name == name:
-                current = constraint
+            current = constraint
 
         if current == None:
-            setOptionEnabled(False)
+            self.setOptionEnabled(False)
             Debug.end("ConstraintWidget::getConstraintFromName (Error 3)")
             return;
 
@@ -1212,6 +1450,7 @@ class ConstraintWidget(QWidget):
 
         a = SuricatesAlgo(intputList, self.currentProject, self.suricates)
         a.deleteTmp = QMessageBox.question(None, "delete temporary files?", "do you want delete temporary file?") == QMessageBox.StandardButton.Yes
+        a.keepInMemory = QMessageBox.question(None, "keep rasters in memory?", "do you want keep the intermediate rasters in memory (faster but uses more memory)?") == QMessageBox.StandardButton.Yes
         
         self.suricates.tasks.append( a )
         #a.run()
@@ -1224,28 +1463,19 @@ class ConstraintWidget(QWidget):
     def onSave(self):
         # get the type
         Debug.begin("ConstraintWidget::onSave")
-        if not self.w_priority.isEnabled():
-            typeIn = ConstraintType.Map
-        elif self.w_nearInRB.isChecked(): typeIn = ConstraintType.Attractive
-        elif self.w_farInRB.isChecked(): typeIn = ConstraintType.Repulsive
-        elif self.w_inInRB.isChecked(): typeIn = ConstraintType.Included
-        elif self.w_outInRB.isChecked(): typeIn = ConstraintType.Excluded
-        elif self.w_excludeInRB.isChecked(): typeIn = ConstraintType.Sanctuarized
-        else:
+        if not self.w_priority.isEnabled(): typeIn = ConstraintType.Map
+        else: typeIn = self.checkedType(self.w_insideRB)
+        if typeIn == None:
             Debug.end("ConstraintWidget::onSave (Error 1)")
             return;
 
         if typeIn == ConstraintType.Map: typeOut = ConstraintType.Excluded
-        elif self.w_nearOutRB.isChecked(): typeOut = ConstraintType.Attractive
-        elif self.w_farOutRB.isChecked(): typeOut = ConstraintType.Repulsive
-        elif self.w_inOutRB.isChecked(): typeOut = ConstraintType.Included
-        elif self.w_outOutRB.isChecked(): typeOut = ConstraintType.Excluded
-        elif self.w_excludeOutRB.isChecked(): typeOut = ConstraintType.Sanctuarized
-        else:
+        else: typeOut = self.checkedType(self.w_outsideRB)
+        if typeOut == None:
             Debug.end("ConstraintWidget::onSave (Error 1)")
             return;
 
-        Debug.print("type:" + SuricatesInstance.ConstraintTypeToString(type))
+        Debug.print(f"type: {SuricatesInstance.ConstraintTypeToString(typeIn)} {SuricatesInstance.ConstraintTypeToString(typeOut)}")
 
         # get the distance
         distance = self.w_buffer.value()
@@ -1275,7 +1505,7 @@ class ConstraintWidget(QWidget):
         constraint.buffer = distance
 
         if not self.suricates.saveConstraint(self.currentProject, constraint, False):
-            self.suricates.iface.messageBar().pushMessage("Faillure!", "save constraint:", level=Qgis.Critical)
+            self.suricates.messageBar.pushMessage("Faillure!", "save constraint:", level=Qgis.Critical)
             Debug.end("ConstraintWidget::onSave (Error 4)")
             return;
 
@@ -1307,33 +1537,56 @@ class ConstraintWidget(QWidget):
             Debug.end("ConstraintWidget::onAddNewConstraint (Error 2)")
             return;
 
-        constraintsList = self.suricates.getConstraintsFromConfig(project, configLayer)
+        # the constraint is created when the layer is written (see ConstraintWidget.addNewConstraint)
+        projectName = self.currentProject
+        extent = None
+        if self.w_currentView.isChecked():
+            canvas = self.suricates.iface.mapCanvas()
+            extent = QgsReferencedRectangle(canvas.extent(), canvas.mapSettings().destinationCrs())
+        if not self.suricates.copyCurrentLayer(projectName, lambda layer: self.addNewConstraint(projectName, layer), extent):
+            Debug.end("ConstraintWidget::onAddNewConstraint (faillure)")
+            return
 
-        haveMap = False
-        for c in constraintsList:
-            if c.typeIn == ConstraintType.Map:
-                haveMap = True
+        Debug.end("ConstraintWidget::onAddNewConstraint (started)")
+        return
 
-        layer = self.suricates.copyCurrentLayer(self.currentProject)
+    ## @brief create the constraint of a layer copied by ConstraintWidget.onAddNewConstraint
+    # @param projectName name of the project of the constraint
+    # @param layer the copied layer (QgsLayerTreeLayer), None if the copy failed
+    #
+    # the first constraint of a project is its map: the configuration is read when the layer is written,
+    # a copy started before this one may have already saved the map.
+    def addNewConstraint(self, projectName, layer):
+        Debug.begin("ConstraintWidget::addNewConstraint")
         if layer == None:
-            Debug.end("ConstraintWidget::onAddNewConstraint (faillure)")
+            Debug.end("ConstraintWidget::addNewConstraint (faillure)")
             return
 
+        project = self.suricates.getProject(projectName)
+        configLayer = self.suricates.getConfig(project) if project != None else None
+        if configLayer == None:
+            Debug.end("ConstraintWidget::addNewConstraint (Error 1)")
+            return
+
+        haveMap = any(c.typeIn == ConstraintType.Map for c in self.suricates.getConstraintsFromConfig(project, configLayer))
+
         if haveMap:
             constraint = ConstraintItem(layer.name())
         else:
             constraint = ConstraintItem(layer.name(), 0, 5, ConstraintType.Map)
 
-        if not self.suricates.saveConstraint(self.currentProject, constraint, True):
-            self.suricates.iface.messageBar().pushMessage("Faillure!", "create new constraint:", level=Qgis.Critical)
-            Debug.end("ConstraintWidget::onAddNewConstraint (faillure)")
+        if not self.suricates.saveConstraint(projectName, constraint, True):
+            self.suricates.messageBar.pushMessage("Faillure!", "create new constraint:", level=Qgis.Critical)
+            Debug.end("ConstraintWidget::addNewConstraint (faillure)")
             return;
 
-        twi = QTreeWidgetItem([constraint.name, SuricatesInstance.ConstraintTypeToString(constraint.typeIn), SuricatesInstance.ConstraintTypeToString(constraint.typeOut), str(constraint.buffer),str(constraint.priority)])
-        self.w_listConstraints.addTopLevelItem(twi)
+        # the list displays the current project only
+        if projectName == self.currentProject:
+            twi = QTreeWidgetItem([constraint.name, SuricatesInstance.ConstraintTypeToString(constraint.typeIn), SuricatesInstance.ConstraintTypeToString(constraint.typeOut), str(constraint.buffer),str(constraint.priority)])
+            self.w_listConstraints.addTopLevelItem(twi)
 
-        self.suricates.iface.messageBar().pushMessage("Success!", "create new constraint", level=Qgis.Success, duration=3)
-        Debug.end("ConstraintWidget::onAddNewConstraint (success)")
+        self.suricates.messageBar.pushMessage("Success!", "create new constraint", level=Qgis.Success, duration=3)
+        Debug.end("ConstraintWidget::addNewConstraint (success)")
         return
 
     ## @brief click on a item of the constraint list
@@ -1399,7 +1652,7 @@ class ConstraintWidget(QWidget):
 
         ok = self.suricates.saveConstraint(self.currentProject, current, False)
         if not ok:
-            self.suricates.iface.messageBar().pushMessage("Faillure!", "save constraint:", level=Qgis.Critical)
+            self.suricates.messageBar.pushMessage("Faillure!", "save constraint:", level=Qgis.Critical)
             Debug.end("ConstraintWidget::onChangeThreshold (Error 4)")
             return;
 
@@ -1415,6 +1668,9 @@ class HeaderWidget(QGroupBox):
     ## @var suricates
     # current SuricatesInstance
 
+    ## @var projectIndex
+    # index of each project in the combobox, key: name of the project
+
     ## @brief constructor
     # @param parent parent (QWidget)
     def __init__(self, parent=None):
@@ -1422,6 +1678,7 @@ class HeaderWidget(QGroupBox):
         Debug.begin("HeaderWidget::__init__")
 
         self.suricates = parent.suricates
+        self.projectIndex = dict()
 
         # build content of the widget
         ## first line
@@ -1479,55 +1736,60 @@ class HeaderWidget(QGroupBox):
 
     ## @brief display projects in the combobox
     # @param projects map of the projects
+    #
+    # the items are added at once without signal nor paint: the selected project is kept if it still exists (else the first one is selected)
+    # and the selection is notified once.
+    @Debug.traced("HeaderWidget::setProjects")
     def setProjects(self, projects):
-        Debug.begin("HeaderWidget::setProjects")
-        self.combobox_project.clear();
-        for x in projects.keys():
-            self.combobox_project.addItem(x);
-        Debug.end("HeaderWidget::setProjects")
+        previous = self.combobox_project.currentText()
+        names = list(projects.keys())
+        self.projectIndex = {name: i for i, name in enumerate(names)}
+        # the combobox is painted once, when the items are set
+        self.combobox_project.setUpdatesEnabled(False)
+        with QSignalBlocker(self.combobox_project):
+            self.combobox_project.clear();
+            self.combobox_project.addItems(names);
+            if len(names) > 0: self.combobox_project.setCurrentIndex(self.projectIndex.get(previous, 0))
+        self.combobox_project.setUpdatesEnabled(True)
+        if len(names) > 0: self.onSelectionChange(self.combobox_project.currentText())
         return
 
     ## @brief called if user edit text in line edit (name of the new project)
     # if the text is empty or corresponds to an existing project name then the button 'new project' is desactivated;
     # else the button 'new project' is enabled;
+    @Debug.traced("HeaderWidget::onTextEdited")
     def onTextEdited(self):
-        Debug.begin("HeaderWidget::onTextEdited")
         t = self.newlineedit_project.text()
         if t == "" or self.suricates.projectNameExists(t):
             self.button_newproject.setEnabled(False)
         else:
             self.button_newproject.setEnabled(True)
-        Debug.end("HeaderWidget::onTextEdited")
         return
 
     ## @brief called if button 'new project' is clicked
     # create a new group in layer in the layer panel with the name contained in the QTextEdit
+    @Debug.traced("HeaderWidget::onCreateNewProject")
     def onCreateNewProject(self):
-        Debug.begin("HeaderWidget::onCreateNewProject")
         t = self.newlineedit_project.text()
         self.newlineedit_project.setText("")
         self.suricates.createNewProject(t)
-        index = self.combobox_project.findText(t)
-        self.combobox_project.setCurrentIndex(index)
-        Debug.end("HeaderWidget::onCreateNewProject")
+        self.combobox_project.setCurrentIndex(self.projectIndex.get(t, -1))
         return
 
     ## @brief called if button 'delete project' is clicked
     # delete the selected group
+    @Debug.traced("HeaderWidget::onDeleteProject")
     def onDeleteProject(self):
-        Debug.begin("HeaderWidget::onDeleteProject")
         t = self.combobox_project.currentText()
         self.suricates.deleteProject(t)
-        Debug.end("HeaderWidget::onDeleteProject")
         return
 
     ## @brief called if the selected item of the combobox id changed
     # delete the selected group
     # @param text the value of the combobox
+    @Debug.traced("HeaderWidget::onSelectionChange")
     def onSelectionChange(self, text):
-        Debug.begin("HeaderWidget::onSelectionChange")
         self.suricates.selectProject(text)
-        Debug.end("HeaderWidget::onSelectionChange")
         return
 
 ## @brief main widget for suricates, it containts a HeaderWidget and a ConstraintWidget
@@ -1543,6 +1805,30 @@ class SuricatesWidget(QWidget):
     ## @var constraintWidget
     ## the ConstraintWidget at the bottom of the widget: manage the constrains of the selected project
 
+    ## @var creationTime
+    ## time (time.monotonic) of the creation of the widget: start of the display of the credit widget
+
+    ## @brief emitted when the projects are loaded: the main widget is displayed (see SuricatesWidget.onReadyToShow)
+    readyToShow = pyqtSignal()
+
+    ## @brief minimum display time (milliseconds) of the credit widget
+    CREDIT_MIN_DELAY = 1000
+
+    ## @brief logos of the credit widget (suricates, CDI, Université de Lille), decoded and scaled once for all the widgets
+    logoPixmaps = None
+
+    ## @brief get the logos of the credit widget
+    # @return the pixmaps (suricates, CDI, Université de Lille)
+    #
+    # the pixmaps are created at the first call: a QPixmap needs the QGIS application
+    @staticmethod
+    def getLogoPixmaps():
+        if SuricatesWidget.logoPixmaps == None:
+            SuricatesWidget.logoPixmaps = (QPixmap(":/plugins/suricates/logo_suricates.svg").scaledToWidth(400, Qt.SmoothTransformation),
+                                           QPixmap(":/plugins/suricates/logo_cdi.svg").scaledToHeight(100, Qt.SmoothTransformation),
+                                           QPixmap(":/plugins/suricates/logo_Universite_de_Lille.svg").scaledToHeight(100, Qt.SmoothTransformation))
+        return SuricatesWidget.logoPixmaps
+
     ## @brief constructor
     # @param parent parent of the widget (QWidget)
     def __init__(self, parent):
@@ -1559,20 +1845,18 @@ class SuricatesWidget(QWidget):
         self.creditWidget = QWidget(self.stackedWidget)
         self.stackedWidget.addWidget(self.creditWidget)
         creditlayout = QVBoxLayout(self.creditWidget)
+        self.logoPixmap3, self.logoPixmap, self.logo2Pixmap = SuricatesWidget.getLogoPixmaps()
 
         self.logoWidget3 = QLabel(self.creditWidget)
-        self.logoPixmap3 = QPixmap(":/plugins/suricates/logo_suricates.svg").scaledToWidth(400, Qt.SmoothTransformation)
         self.logoWidget3.setPixmap(self.logoPixmap3)
         self.logoWidget3.setAlignment(Qt.AlignHCenter)
         creditlayout.addWidget(self.logoWidget3)
 
         self.logoWidget = QLabel(self.creditWidget)
-        self.logoPixmap = QPixmap(":/plugins/suricates/logo_cdi.svg").scaledToHeight(100, Qt.SmoothTransformation)
         self.logoWidget.setPixmap(self.logoPixmap)
         self.logoWidget.setAlignment(Qt.AlignHCenter)
 
         self.logo2Widget = QLabel(self.creditWidget)
-        self.logo2Pixmap = QPixmap(":/plugins/suricates/logo_Universite_de_Lille.svg").scaledToHeight(100, Qt.SmoothTransformation)
         self.logo2Widget.setPixmap(self.logo2Pixmap)
         self.logo2Widget.setAlignment(Qt.AlignHCenter)
 
@@ -1597,27 +1881,23 @@ class SuricatesWidget(QWidget):
         self.stackedWidget.addWidget(self.mainWidget)
 
         self.setLayout(globalLayout)
-        self.suricates.iface.currentLayerChanged.connect(self.handleLayerChanged)
 
-        QTimer.singleShot(4000, self.goToMainWidget)
+        # the credit widget is displayed until the projects are loaded
+        self.creationTime = time.monotonic()
+        self.readyToShow.connect(self.onReadyToShow)
 
         Debug.end("SuricatesWidget::__init__")
 
+    ## @brief called when the projects are loaded: display the main widget after the minimum display time of the credit widget
+    def onReadyToShow(self):
+        elapsed = int((time.monotonic() - self.creationTime) * 1000)
+        QTimer.singleShot(max(0, SuricatesWidget.CREDIT_MIN_DELAY - elapsed), self.goToMainWidget)
+
     def goToMainWidget(self):
         Debug.begin("SuricatesWidget::goToMainWidget")
         self.stackedWidget.setCurrentIndex(1)
         Debug.end("SuricatesWidget::goToMainWidget")
 
-    ## @brief executed when a layer is changed, this was a test
-    def handleLayerChanged(self):
-        Debug.begin("SuricatesWidget::handleLayerChanged")
-        # mylayer = self.suricates.iface.activeLayer()
-        # if not (mylayer is None):
-        #	 name = mylayer.name()
-        #	 self.suricates.iface.messageBar().pushMessage("Layer changed", name, level = Qgis.Info, duration=3)
-        # print(type(iface.activeLayer()))
-        Debug.end("SuricatesWidget::handleLayerChanged")
-
     ## @brief select the curent project
     # @name name of the project
     def setProject(self, name):
@@ -1655,7 +1935,7 @@ class SuricatesInstance():
     # list of tasks (SuricatesAlgo) which are currently in progress
 
     ## @var blockSignals
-    # used to block signal to avoid conflicts between user manipulation and program process
+    # used to block signal to avoid conflicts between user manipulation and program process (set by SuricatesInstance.signalsBlocked)
 
     ## @var projectsNodeName
     # default name of the group 'Project' of the panel of layers
@@ -1663,10 +1943,46 @@ class SuricatesInstance():
     ## @var dock
     # the SuricatesDock created in the current instance
 
+    ## @var qgsProject
+    # the QgsProject singleton (QgsProject.instance())
+
+    ## @var messageBar
+    # the message bar of the QGIS interface (iface.messageBar())
+
+    ## @var projectsCache
+    # projects read by SuricatesInstance.readProjects, key: name of the project (None when the group 'Projects' has changed)
+
+    ## @var wiredProjects
+    # projects whose signal 'nameChanged' is connected to SuricatesInstance.onNameChanged, key: id of the node
+    # (the nodes are referenced: their id stays unique while they are in the dictionary)
+
+    ## @var layerIndex
+    # layers of the groups read by SuricatesInstance.getLayer, key: id of the group, value: (group, layers by name)
+
+    ## @var configCache
+    # configuration layer (tree node) of the projects read by SuricatesInstance.getConfig, key: id of the project, value: (project, configuration)
+
+    ## @var configFields
+    # index of the fields of the 'project_config' layers, key: id of the layer, value: index by field name (see SuricatesInstance.getConfigFields)
+
+    ## @var pendingFiles
+    # files of the copies written by a VectorWriterTask which is not finished (see SuricatesInstance.copyCurrentLayer)
+
+    ## @var pendingLayers
+    # layer names of the copies written by a VectorWriterTask which is not finished, (project name, layer name)
+
+    ## @var updatePending
+    # an update of the projects is scheduled (see SuricatesInstance.scheduleUpdateProjects)
+
+    ## @var closed
+    # the instance is closed (see SuricatesInstance.closeInstance): the scheduled updates are ignored
+
     ## @brief constructor
     def __init__(self, iface):
         Debug.begin("SuricatesInstance::__init__")
         self.iface = iface
+        self.qgsProject = QgsProject.instance()
+        self.messageBar = iface.messageBar()
 
         # initialize variables
         self.tasks = list()
@@ -1674,24 +1990,61 @@ class SuricatesInstance():
         self.blockSignals = False
         self.projectsNodeName = "Projects"
         self.projectNode = None
+        self.projectsCache = None
+        self.updatePending = False
+        self.closed = False
+        self.wiredProjects = dict()
+        self.layerIndex = dict()
+        self.configCache = dict()
+        self.configFields = dict()
+        self.pendingFiles = set()
+        self.pendingLayers = set()
 
         # dock the new instance
         self.dock = SuricatesDock(self)
         self.dock.setAttribute(Qt.WA_DeleteOnClose) # set behavior: delete dock widget when closed
         self.iface.addDockWidget(Qt.RightDockWidgetArea,self.dock)
-        QgsProject.instance().cleared.connect(self.closeInstance)
+        self.qgsProject.cleared.connect(self.closeInstance)
+        self.qgsProject.layersWillBeRemoved.connect(self.onLayersWillBeRemoved)
         Debug.end("SuricatesInstance::__init__")
 
+    ## @brief context manager which blocks the signals of the layer tree handled by the instance
+    #
+    # the previous state is restored when the block ends, even if an exception is raised: a block may be nested in another one
+    @contextlib.contextmanager
+    def signalsBlocked(self):
+        previous = self.blockSignals
+        self.blockSignals = True
+        try: yield
+        finally: self.blockSignals = previous
+
+    ## @brief forget the configurations and the fields of the removed layers
+    # @param layerIds id of the removed layers (list of string)
+    def onLayersWillBeRemoved(self, layerIds):
+        self.configCache = dict()
+        for layerId in layerIds:
+            self.configFields.pop(layerId, None)
+
     ## @brief close suricates instance
     #
     # disconnect signals
     def closeInstance(self):
         Debug.begin("SuricatesInstance::closeInstance")
+        # an update already queued by SuricatesInstance.scheduleUpdateProjects is ignored
+        self.closed = True
+        self.updatePending = False
         # disconnect projects
-        projects = self.readProjects()
-        for x in projects.values():
+        for x in self.wiredProjects.values():
             try: x.nameChanged.disconnect(self.onNameChanged)
             except: pass
+        self.wiredProjects = dict()
+        try: self.qgsProject.layersWillBeRemoved.disconnect(self.onLayersWillBeRemoved)
+        except: pass
+        try: self.qgsProject.cleared.disconnect(self.closeInstance)
+        except: pass
+        # the nodes of the layer tree aren't referenced any more by the closed instance
+        self.invalidateProjects()
+        self.configFields = dict()
         # disconnect projects node
         try: self.projectNode.removedChildren.disconnect(self.onNodeDeleted)
         except: pass
@@ -1718,18 +2071,14 @@ class SuricatesInstance():
                 Debug.end("SuricatesInstance::initializeProjectNode (error)")
                 pass
 
-        root = QgsProject.instance().layerTreeRoot()
-        found = False
-        # search the group 'Project'
-        for child in root.children():
-            if isinstance(child, QgsLayerTreeGroup):
-                if child.name() == self.projectsNodeName:
-                    self.projectNode = child
-                    found = True
+        root = self.qgsProject.layerTreeRoot()
+        # search the group 'Project' (the search is done by QGIS)
+        self.projectNode = root.findGroup(self.projectsNodeName)
 
         # create a group 'Project' if it is not exist
-        if not found:
+        if self.projectNode == None:
             self.projectNode = root.addGroup(self.projectsNodeName)
+        self.projectsCache = None
         # connection:
         # if user remove a child of the group 'Project' then the program call the method 'onNodeDeleted'
         self.projectNode.removedChildren.connect(self.onNodeDeleted)
@@ -1740,8 +2089,14 @@ class SuricatesInstance():
 
 
     ## @brief  return the list of the projects
+    #
+    # the projects are read again only when the group 'Projects' has changed (see SuricatesInstance.invalidateProjects)
     def readProjects(self):
         Debug.begin("SuricatesInstance::readProjects")
+        self.initializeProjectNode()
+        if self.projectsCache != None:
+            Debug.end("SuricatesInstance::readProjects (cache)")
+            return self.projectsCache
         # dictionary to return
         projects = dict();
         # verify that project have different names
@@ -1750,12 +2105,23 @@ class SuricatesInstance():
         for child in self.projectNode.children():
             if isinstance(child, QgsLayerTreeGroup):
                 projects[child.name()] = child
+        self.projectsCache = projects
         Debug.end("SuricatesInstance::readProjects")
         return projects;
 
+    ## @brief forget the projects read by SuricatesInstance.readProjects, the layers read by SuricatesInstance.getLayer and the configurations read by SuricatesInstance.getConfig
+    #
+    # called when a project is created, deleted or renamed (the signals of the group 'Projects' come also from the layers of the projects)
+    def invalidateProjects(self):
+        self.projectsCache = None
+        self.layerIndex = dict()
+        self.configCache = dict()
+
     ## @brief update project signals
+    @Debug.traced("SuricatesInstance::updateProjects")
     def updateProjects(self):
-        Debug.begin("SuricatesInstance::updateProjects")
+        # a scheduled update is done now
+        self.updatePending = False
         # get the list of projects
         projects = self.readProjects()
         # send it to the combobox of the HeaderWidget
@@ -1764,78 +2130,91 @@ class SuricatesInstance():
         if len(projects) == 0:
              self.dock.w_suricates.projectWidget.onSelectionChange(None)
 
-        # connections for each project
+        # connections for the new projects (the deleted projects are forgotten)
+        wired = dict()
         for x in projects.values():
-            # disconnect to avoid multiple connections if it is possible
-            try: x.nameChanged.disconnect(self.onNameChanged)
-            except: pass
-            # if user edits the name of the project then the program calls the method 'onNameChanged'
-            x.nameChanged.connect(self.onNameChanged)
-        Debug.end("SuricatesInstance::updateProjects")
+            if id(x) not in self.wiredProjects:
+                # if user edits the name of the project then the program calls the method 'onNameChanged'
+                x.nameChanged.connect(self.onNameChanged)
+            wired[id(x)] = x
+        self.wiredProjects = wired
+
+    ## @brief update the projects when the event loop is idle
+    #
+    # the signals of the layer panel come in bursts (creation then rename...): the projects are updated once for all of them
+    def scheduleUpdateProjects(self):
+        if self.updatePending or self.closed: return
+        self.updatePending = True
+        QTimer.singleShot(0, self.flushUpdateProjects)
+
+    ## @brief do the update scheduled by SuricatesInstance.scheduleUpdateProjects (if it is not already done)
+    def flushUpdateProjects(self):
+        if not self.updatePending or self.closed: return
+        self.updateProjects()
 
     ## @brief called when a project node is renamed (layer panel)
-    # @see updateProjects()
+    # @see scheduleUpdateProjects()
     def onNameChanged(self):
+        self.invalidateProjects()
         if self.blockSignals: return;
         Debug.begin("SuricatesInstance::onNameChanged")
-        self.updateProjects()
+        self.scheduleUpdateProjects()
         Debug.end("SuricatesInstance::onNameChanged")
 
     ## @brief called when a project node is created (layer panel)
-    # @see updateProjects()
+    # @see scheduleUpdateProjects()
     def onNodeCreated(self):
+        self.invalidateProjects()
         if self.blockSignals: return;
         Debug.begin("SuricatesInstance::onNodeCreated")
-        self.updateProjects()
+        self.scheduleUpdateProjects()
         Debug.end("SuricatesInstance::onNodeCreated")
 
     ## @brief called when a project node is deleted (layer panel)
-    # @see updateProjects()
+    # @see scheduleUpdateProjects()
     def onNodeDeleted(self):
+        self.invalidateProjects()
         if self.blockSignals: return;
         Debug.begin("SuricatesInstance::onNodeDeleted")
-        self.updateProjects()
+        self.scheduleUpdateProjects()
         Debug.end("SuricatesInstance::onNodeDeleted")
 
     ## @brief create a new project node
     # @param projectName name of the new project
+    @Debug.traced("SuricatesInstance::createNewProject")
     def createNewProject(self, projectName):
-        Debug.begin("SuricatesInstance::createNewProject")
         # create a new group for project
         project = self.projectNode.addGroup(projectName)
-        # connection
-        # if user rename the project then the program calls the method 'onNameChanged'
-        project.nameChanged.connect(self.onNameChanged)
-        Debug.end("SuricatesInstance::createNewProject")
+        self.invalidateProjects()
+        # the combobox must know the new project now: it is selected by the caller
+        # (the update also connects the signal 'nameChanged' of the project to the method 'onNameChanged')
+        self.updateProjects()
 
     ## @brief delete a project node
     # @param projectName (string) name of the project to delete
+    @Debug.traced("SuricatesInstance::deleteProject")
     def deleteProject(self, projectName):
-        Debug.begin("SuricatesInstance::deleteProject")
         # get the list of projects
         projects = self.readProjects()
         # search the selected project (projectName) and remove it
-        for x,y in projects.items():
-            if x == projectName:
-                self.projectNode.removeChildNode(y)
+        project = projects.get(projectName)
+        if project != None:
+            self.projectNode.removeChildNode(project)
 
+        self.invalidateProjects()
         self.updateProjects()
-        Debug.end("SuricatesInstance::deleteProject")
 
     ## @brief return if a name already exists in projects
     # @param projectName (string) name of the projet to search
+    #
+    # this is a lookup in the projects cache (see SuricatesInstance.readProjects): the tree is read and the names are verified only after a change of the projects
+    @Debug.traced("SuricatesInstance::projectNameExists")
     def projectNameExists(self, projectName):
-        Debug.begin("SuricatesInstance::projectNameExists")
-        projects = self.readProjects()
-        result = False
-        if projectName in projects:
-            result = True
-        Debug.end("SuricatesInstance::projectNameExists")
-        return result
+        return projectName in self.readProjects()
 
     ## @brief verify if many project have the same name and fix this
+    @Debug.traced("SuricatesInstance::verifyProjectName")
     def verifyProjectName(self):
-        Debug.begin("SuricatesInstance::verifyProjectName")
         # list the projects
         projects = list()
         self.initializeProjectNode()
@@ -1843,15 +2222,16 @@ class SuricatesInstance():
             if isinstance(child, QgsLayerTreeGroup):
                 projects.append(child)
 
-        # compare the name of each project to rename when the names are identic
+        # rename a project when its name is already used by a previous one (single pass over the names)
         renamedList = list()
-        for i in projects:
-            for j in projects:
-                if i != j:
-                    if i.name() == j.name():
-                        j.setName(j.name() + "'")
-                        if not j in renamedList:
-                            renamedList.append(j)
+        names = set()
+        for project in projects:
+            name = project.name()
+            if name in names:
+                while name in names: name += "'"
+                project.setName(name)
+                renamedList.append(project)
+            names.add(name)
 
         # display informations for users
         if len(renamedList) > 0:
@@ -1859,8 +2239,7 @@ class SuricatesInstance():
             for k in renamedList:
                 str += "\n -" + k.name()
 
-            self.iface.messageBar().pushMessage("Warning", str, level = Qgis.Warning, duration=5)
-        Debug.end("SuricatesInstance::verifyProjectName")
+            self.messageBar.pushMessage("Warning", str, level = Qgis.Warning, duration=5)
 
     ## @brief get the project defined by a name
     # @param name name of the project to search
@@ -1882,66 +2261,91 @@ class SuricatesInstance():
 
     ## @brief get the list of layers of a group
     # @param group group
+    @Debug.traced("SuricatesInstance::getLayers")
     def getLayers(self, group):
-        Debug.begin("SuricatesInstance::getLayers")
-        layers = list()
+        layers = [child for child in group.children() if isinstance(child, QgsLayerTreeLayer)]
 
-        for child in group.children():
-            if isinstance(child, QgsLayerTreeLayer):
-                layers.append(child)
+        if Debug.enabled: SuricatesInstance.displayLayers(layers)
 
-        self.displayLayers(layers)
-
-        Debug.end("SuricatesInstance::getLayers")
         return layers;
 
+    ## @brief get the layers (tree nodes) of a group by name
+    # @param group group
+    # @return dictionary of the layers, key: name of the layer (the first layer of a name is used)
+    #
+    # the layers of the group are indexed at the first call (see SuricatesInstance.layerIndex)
+    def getLayersByName(self, group):
+        entry = self.layerIndex.get(id(group))
+        if entry == None:
+            layers = dict()
+            for child in group.children():
+                if isinstance(child, QgsLayerTreeLayer): layers.setdefault(child.name(), child)
+            entry = (group, layers)
+            self.layerIndex[id(group)] = entry
+        return entry[1]
+
     ## @brief get a specific layer (tree node) by name of a group
     # @param group group
     # @param name name of the layer
     def getLayer(self, group, name):
         Debug.begin("SuricatesInstance::getLayer: " + group.name() + " " + name)
-        for child in group.children():
-            Debug.print("child: " + child.name() )
-            if isinstance(child, QgsLayerTreeLayer):
-                if child.name() == name:
-                    Debug.end("SuricatesInstance::getLayer (layer exists)")
-                    return child
-            else: Debug.print("ko: " + str(type(child)) )
+        child = self.getLayersByName(group).get(name)
+        if child != None:
+            Debug.end("SuricatesInstance::getLayer (layer exists)")
+            return child
 
         Debug.end("SuricatesInstance::getLayer (layer doesn't exist)")
         return None
 
     ## @brief get the configuration (tree node) of the project or create a new one
     # @param project node of the project
+    #
+    # the configuration is kept until the projects change (see SuricatesInstance.configCache)
     def getConfig(self,project):
         Debug.begin("SuricatesInstance::getConfig")
+        entry = self.configCache.get(id(project))
+        if entry != None:
+            Debug.end("SuricatesInstance::getConfig (cache)")
+            return entry[1]
         configLayer = self.getLayer(project, "project_config")
         if configLayer == None:
+            configLayer = self.createConfig(project)
+            if configLayer != None: self.configCache[id(project)] = (project, configLayer)
             Debug.end("SuricatesInstance::getConfig (new)")
-            return self.createConfig(project)
+            return configLayer
+        self.configCache[id(project)] = (project, configLayer)
         Debug.end("SuricatesInstance::getConfig (existing)")
         return configLayer
 
     ## @brief get the list of constraints from the layer tree node
-    def getConstraintsFromConfig(self, projectNode, configLayer):
-        Debug.begin("SuricatesInstance::getConstraintsFromConfig")
+    # @param projectNode node of the project (QgsLayerTreeGroup)
+    # @param configLayer node of the 'project_config' (QgsLayerTreeLayer)
+    # @param names only the constraints of these names are read (set of string), None to read all the constraints
+    # @return the constraints (list of ConstraintItem)
+    @Debug.traced("SuricatesInstance::getConstraintsFromConfig")
+    def getConstraintsFromConfig(self, projectNode, configLayer, names = None):
         constraints = list()
 
-        configs = QgsProject.instance().mapLayer(configLayer.layerId())
-        features = configs.getFeatures()
+        # the tree node references the layer: the registry of the project isn't searched
+        configs = configLayer.layer()
+        # the features of 'project_config' have no geometry: only the fields of the constraints are read
+        request = QgsFeatureRequest().setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(list(self.getConfigFields(configs).values()))
+        features = configs.getFeatures(request)
 
         Debug.print(projectNode.name())
 
+        # the layers of the project are read once for all the features
+        layers = self.getLayersByName(projectNode)
         for feature in features:
             name = feature["base"]
-            c = ConstraintItem( name,feature["buffer"],feature["priority"],SuricatesInstance.ConstraintTypeFromString(feature["typeIn"]),SuricatesInstance.ConstraintTypeFromString(feature["typeOut"]))
-            if self.getLayer(projectNode, name) == None: c.exists = False
-            else: c.exists = True
+            if names != None and not name in names: continue
+            c = ConstraintItem( name,feature["buffer"],feature["priority"],constraintTypesByName.get(feature["typeIn"]),constraintTypesByName.get(feature["typeOut"]))
+            c.exists = name in layers
             constraints.append(c)
 
-        SuricatesInstance.displayConstraints(constraints)
+        if Debug.enabled: SuricatesInstance.displayConstraints(constraints)
 
-        Debug.end("SuricatesInstance::getConstraintsFromConfig")
         return constraints
 
     ## @brief save a constraint in a group
@@ -1973,12 +2377,16 @@ class SuricatesInstance():
     # @return a new filename
     def createFileName(self, projectName, baseName, extention):
         Debug.begin("SuricatesInstance::createFileName")
-        projectPath = QDir(QgsProject.instance().absolutePath())
-        file = QFileInfo(projectPath, projectName + "_" + baseName + "." + extention)
+        # the names are probed with os.path: the QFileInfo is created for the free name only
+        projectPath = self.qgsProject.absolutePath()
+        prefix = projectName + "_" + baseName
+        path = os.path.join(projectPath, prefix + "." + extention)
         i=1
-        while file.exists():
-            file = QFileInfo(projectPath, projectName + "_" + baseName + "_" + str(i) + "." + extention)
+        # the files of the copies in progress are not written yet (see SuricatesInstance.pendingFiles)
+        while os.path.exists(path) or path in self.pendingFiles:
+            path = os.path.join(projectPath, prefix + "_" + str(i) + "." + extention)
             i = i + 1
+        file = QFileInfo(path)
         Debug.end("SuricatesInstance::createFileName")
         return file
 
@@ -1988,18 +2396,18 @@ class SuricatesInstance():
     # @param projectName: project which receipt the new layer (string)
     # @param layerBaseName: base name for the layer (string)
     # @return a name for a new layer (string)
+    @Debug.traced("SuricatesInstance::createLayerName")
     def createLayerName(self, projectName, layerBaseName):
-        Debug.begin("SuricatesInstance::createLayerName")
         project = self.getProject(projectName)
 
         name = layerBaseName
         i = 0;
 
-        while self.getLayer(project, name) != None:
+        # the layers of the copies in progress are not in the group yet (see SuricatesInstance.pendingLayers)
+        while self.getLayer(project, name) != None or (projectName, name) in self.pendingLayers:
             name = layerBaseName + "_" + str(i)
             i = i + 1
 
-        Debug.end("SuricatesInstance::createLayerName")
         return name
 
     ## @brief convert the enum ConstraintType to text
@@ -2007,53 +2415,35 @@ class SuricatesInstance():
     # @return type (string)
     @staticmethod
     def ConstraintTypeToString(type):
-       if(type == ConstraintType.Attractive): return "Attractive"
-       if(type == ConstraintType.Repulsive): return "Repulsive"
-       if(type == ConstraintType.Included): return "Included"
-       if(type == ConstraintType.Excluded): return "Excluded"
-       if(type == ConstraintType.Sanctuarized): return "Sanctuarized"
-       if(type == ConstraintType.Map): return "Map"
-       return "None"
+       return constraintTypeNames.get(type, "None")
 
     ## @brief convert text to the enum ConstraintType
     # @param typeName (string)
     # @return (ConstraintType)
     @staticmethod
     def ConstraintTypeFromString(typeName):
-        print(typeName)
-        if(typeName == "Attractive"): return ConstraintType.Attractive
-        if(typeName == "Repulsive"): return ConstraintType.Repulsive
-        if(typeName == "Included"): return ConstraintType.Included
-        if(typeName == "Excluded"): return ConstraintType.Excluded
-        if(typeName == "Sanctuarized"): return ConstraintType.Sanctuarized
-        if(typeName == "Map"): return ConstraintType.Map
-        return None
+        return constraintTypesByName.get(typeName)
 
     ## @brief create a configuration file for a project
     # @param project node of the project (QgsLayerTreeGroup)
     # @return the created layer if registration done (QgsVectorLayer)
     def createConfig(self, project):
         Debug.begin("SuricatesInstance::createConfig")
-        self.blockSignals = True
         # ------------------------
         # create memory layer
         # ------------------------
         layer = QgsVectorLayer("Point", "tp2", "memory")
         pr = layer.dataProvider()
 
-        # Enter editing mode
-        layer.startEditing()
-
-        # add fields
+        # add fields (written by the provider: no editing session)
         pr.addAttributes([QgsField("base", QVariant.String),
                           QgsField("typeIn", QVariant.String),
                           QgsField("typeOut", QVariant.String),
                           QgsField("buffer", QVariant.Int),
                           QgsField("priority", QVariant.Double)])
 
-        # Commit changes
         # this is required to update attributes
-        layer.commitChanges()
+        layer.updateFields()
 
         # get absolute file path
         file = self.createFileName(project.name(), "config", "shp")
@@ -2066,7 +2456,7 @@ class SuricatesInstance():
 
         # manage error
         if error[0] == QgsVectorFileWriter.NoError:
-            self.iface.messageBar().pushMessage("Success!", "writing new config file", level=Qgis.Success, duration=3)
+            self.messageBar.pushMessage("Success!", "writing new config file", level=Qgis.Success, duration=3)
             print("success! writing new memory layer")
             # --------------------------
             # open the created file
@@ -2074,35 +2464,40 @@ class SuricatesInstance():
             uri = file.absoluteFilePath()
             layer_shp = QgsVectorLayer(uri, 'project_config', 'ogr')
 
-            QgsProject.instance().addMapLayer(layer_shp, False)
-            l = project.addLayer(layer_shp)
+            with self.signalsBlocked():
+                self.qgsProject.addMapLayer(layer_shp, False)
+                l = project.addLayer(layer_shp)
             Debug.end("SuricatesInstance::createConfig (success)")
-            self.blockSignals = False
             return l
         else:
-            self.iface.messageBar().pushMessage("Faillure!", "writing new config file:" + str(error), level=Qgis.Critical)
+            self.messageBar.pushMessage("Faillure!", "writing new config file:" + str(error), level=Qgis.Critical)
             Debug.end("SuricatesInstance::createConfig (faillure)")
-            self.blockSignals = False
             return None
 
     ## @brief create a layer from selected layer
     # @param projectName project name (string)
-    # @return the created layer if registration done (QgsVectorLayer)
-    def copyCurrentLayer(self, projectName):
+    # @param onCopied function called with the created layer (QgsLayerTreeLayer) when the file is written, or with None if the writing failed
+    # @param extent only the features which intersect this area are copied (QgsReferencedRectangle), None to copy all the features
+    # @return True if the copy is started
+    #
+    # the features are copied in a memory layer (materialized in the main thread), then the file is written by a VectorWriterTask: the interface isn't blocked by the writing
+    # and the task doesn't read the layer of the project.
+    # The extent is given to the provider of the layer: the features outside of it are not read.
+    # The names of the file and of the layer are reserved until the end of the task: two copies of the same layer don't write the same file.
+    def copyCurrentLayer(self, projectName, onCopied, extent = None):
         Debug.begin("SuricatesInstance::copyCurrentLayer")
-        self.blockSignals = True
         root = self.getProject(projectName)
         # current layer
         layer_shp = self.iface.activeLayer()
         #↨ verify if current layer is valid
         if not type(layer_shp) is QgsVectorLayer:
             Debug.end("SuricatesInstance::copyCurrentLayer (layer not valid)")
-            return None;
+            return False;
 
         print("name:" +  layer_shp.name())
 
         # ------------------------
-        # create memory layer
+        # verify the geometry of the layer
         # ------------------------
         geomtype = layer_shp.wkbType()
         print("type " + str(layer_shp.geometryType()))
@@ -2114,113 +2509,142 @@ class SuricatesInstance():
 
         if geomtype == QgsWkbTypes.Unknown or geomtype == QgsWkbTypes.NoGeometry:
             Debug.end("SuricatesInstance::copyCurrentLayer (layer not valid)")
-            return None;
-
-        # if geomtype == QgsWkbTypes.Point:
-        #    layer = QgsVectorLayer("Point", "tp2", "memory")
-        #if geomtype == QgsWkbTypes.LineString:
-        #    layer = QgsVectorLayer("Line", "tp2", "memory")
-        #if geomtype == QgsWkbTypes.Polygon:
-        #    layer = QgsVectorLayer("Polygon", "tp2", "memory")
-        #if geomtype == QgsWkbTypes.MultiLineString:
-        #    layer = QgsVectorLayer("MultiLine", "tp2", "memory")
-        #if geomtype == QgsWkbTypes.MultiPoint:
-        #    layer = QgsVectorLayer("MultiPoint", "tp2", "memory")
-        #if geomtype == QgsWkbTypes.MultiPolygon:
-        #    layer = QgsVectorLayer("MultiPolygon", "tp2", "memory")
-
-        layer_type = QgsWkbTypes.displayString(layer_shp.wkbType())
-        layer = QgsVectorLayer(layer_type,"tp2","memory")
-
-        pr = layer.dataProvider()
-
-        # Enter editing mode
-        layer.startEditing()
-
-        # add fields
-        pr.addAttributes(layer_shp.fields())
-
-        # Commit changes
-        # this is required to update attributes
-        layer.commitChanges()
+            return False;
 
         # --------------------------
         # copy
         # ---------------------------
-        count = 0
+        # the copy is a memory layer with the fields and the CRS of the layer: the features are streamed by the provider, not copied in a python list
+        request = QgsFeatureRequest()
+        if extent != None:
+            transform = QgsCoordinateTransform(extent.crs(), layer_shp.crs(), self.qgsProject)
+            request.setFilterRect(transform.transformBoundingBox(extent))
+            request.setFlags(QgsFeatureRequest.ExactIntersect)
         if layer_shp.selectedFeatureCount() != 0:
-            count = layer_shp.selectedFeatureCount()
-            pr.addFeatures(layer_shp.selectedFeatures())
-        else:
-            count = layer_shp.featureCount()
-            feat = []
-            for t in layer_shp.getFeatures():
-                feat.append(t)
-            pr.addFeatures(feat)
+            request.setFilterFids(layer_shp.selectedFeatureIds())
+        layer = layer_shp.materialize(request)
+        count = layer.featureCount()
         print("copy : " + str(count) + "/" + str(layer_shp.featureCount()))
 
-        layer.commitChanges()
-
         # get absolute file path
         file = self.createFileName(projectName, layer_shp.name(), "shp")
         layername = self.createLayerName(projectName, layer_shp.name())
+        self.pendingFiles.add(file.absoluteFilePath())
+        self.pendingLayers.add((projectName, layername))
 
         # ------------------------
-        # save the layer as file ans delete the layer
+        # save the layer as file ans delete the layer (in a task)
         # ------------------------
-        error = QgsVectorFileWriter.writeAsVectorFormat(layer, file.absoluteFilePath(), "utf-8",
-                                                        driverName="ESRI Shapefile")
+        crs = layer_shp.crs()
+        task = VectorWriterTask(layer, file.absoluteFilePath(),
+                                lambda error: self.addCopiedLayer(task, error, root, projectName, file.absoluteFilePath(), layername, crs, onCopied))
+        self.tasks.append(task)
+        QgsApplication.taskManager().addTask(task)
+        Debug.end("SuricatesInstance::copyCurrentLayer (started)")
+        return True
+
+    ## @brief open the file written by SuricatesInstance.copyCurrentLayer and add it in the project
+    # @param task the VectorWriterTask which has written the file
+    # @param error result of QgsVectorFileWriter.writeAsVectorFormat (None if the task is canceled)
+    # @param root node of the project
+    # @param projectName name of the project (string)
+    # @param uri name of the written file
+    # @param layername name of the new layer
+    # @param crs coordinate reference system of the copied layer
+    # @param onCopied function called with the created layer (QgsLayerTreeLayer), or with None if the writing failed
+    def addCopiedLayer(self, task, error, root, projectName, uri, layername, crs, onCopied):
+        Debug.begin("SuricatesInstance::addCopiedLayer")
+        self.tasks.remove(task)
+        # the file exists and the layer is added below: the names aren't reserved anymore
+        self.pendingFiles.discard(uri)
+        self.pendingLayers.discard((projectName, layername))
 
         # manage error
-        if error[0] == QgsVectorFileWriter.NoError:
-            self.iface.messageBar().pushMessage("Success!", "writing new layer", level=Qgis.Success, duration=3)
+        if error != None and error[0] == QgsVectorFileWriter.NoError:
+            self.messageBar.pushMessage("Success!", "writing new layer", level=Qgis.Success, duration=3)
             # --------------------------
             # open the created file
             # --------------------------
-            uri = file.absoluteFilePath()
-            crs = layer_shp.crs()
             layer_shp = QgsVectorLayer(uri, layername, 'ogr')
             layer_shp.setCrs(crs)
-            print("items: " + str(layer_shp.featureCount()))
+            Debug.print(f"items: {layer_shp.featureCount()}")
 
-            QgsProject.instance().addMapLayer(layer_shp, False)
-            l = root.addLayer(layer_shp)
-            Debug.end("SuricatesInstance::copyCurrentLayer (success)")
-            self.blockSignals = False
-            return l
+            # the spatial index of the file (.qix) is built once: the rasterization by strips and the display read the features by extent
+            if layer_shp.dataProvider().capabilities() & QgsVectorDataProvider.CreateSpatialIndex:
+                layer_shp.dataProvider().createSpatialIndex()
+
+            with self.signalsBlocked():
+                self.qgsProject.addMapLayer(layer_shp, False)
+                l = root.addLayer(layer_shp)
+            Debug.end("SuricatesInstance::addCopiedLayer (success)")
+            onCopied(l)
         else:
-            self.iface.messageBar().pushMessage("Faillure!", "writing new layer:" + str(error), level=Qgis.Critical)
+            self.messageBar.pushMessage("Faillure!", "writing new layer:" + str(error), level=Qgis.Critical)
             print(str(error))
-            Debug.end("SuricatesInstance::copyCurrentLayer (faillure)")
-            self.blockSignals = False
-            return None
+            Debug.end("SuricatesInstance::addCopiedLayer (faillure)")
+            onCopied(None)
+
+    ## @brief fields of the layer 'project_config' (created by SuricatesInstance.createConfig)
+    configFieldNames = ('base', 'typeIn', 'typeOut', 'buffer', 'priority')
+
+    ## @brief get the index of the fields of a 'project_config' layer
+    # @param layer layer of the 'project_config' (QgsVectorLayer)
+    # @return index of the fields, key: name of the field (see SuricatesInstance.configFieldNames)
+    #
+    # the fields are searched once by layer: the index doesn't depend on the order of the fields in the file
+    def getConfigFields(self, layer):
+        fields = self.configFields.get(layer.id())
+        if fields == None:
+            layerFields = layer.fields()
+            fields = {name: layerFields.indexFromName(name) for name in SuricatesInstance.configFieldNames}
+            self.configFields[layer.id()] = fields
+        return fields
+
+    ## @brief search the feature of a constraint in 'project_config'
+    # @param layer layer of the 'project_config' (QgsVectorLayer)
+    # @param name name of the constraint (string)
+    # @return the id of the feature (None if the constraint isn't in the layer)
+    #
+    # the filter is given to the provider: only the field 'base' of the matching feature is read, without geometry
+    @staticmethod
+    def findConstraintFeature(layer, name):
+        request = QgsFeatureRequest().setFilterExpression('"base" = ' + QgsExpression.quotedValue(name))
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(['base'], layer.fields())
+        request.setLimit(1)
+        feature = next(layer.getFeatures(request), None)
+        if feature == None: return None
+        return feature.id()
+
+    ## @brief search the features of constraints in 'project_config'
+    # @param layer layer of the 'project_config' (QgsVectorLayer)
+    # @param names names of the constraints (list of string)
+    # @return the id of the features (list of int, the constraints which aren't in the layer are ignored)
+    @staticmethod
+    def findConstraintFeatures(layer, names):
+        if len(names) == 0: return list()
+        request = QgsFeatureRequest().setFilterExpression('"base" IN (' + ",".join(QgsExpression.quotedValue(name) for name in names) + ')')
+        request.setFlags(QgsFeatureRequest.NoGeometry)
+        request.setSubsetOfAttributes(['base'], layer.fields())
+        return [feature.id() for feature in layer.getFeatures(request)]
 
     ## @brief save modifications of the modified constraint
+    @Debug.traced("SuricatesInstance::modifyConstraintInConfig")
     def modifyConstraintInConfig(self, configNode, constraint):
-        Debug.begin("SuricatesInstance::modifyConstraintInConfig")
-        layer = QgsProject.instance().mapLayer(configNode.layerId())
+        layer = configNode.layer()
 
-        features = layer.getFeatures()
-        ok = False
-        for feature in features:
-            if feature["base"] == constraint.name:
-                fid = feature.id()
-                ok = True
-
-        if not ok: return False
+        fid = SuricatesInstance.findConstraintFeature(layer, constraint.name)
+        if fid == None: return False
 
         if layer.dataProvider().capabilities() & QgsVectorDataProvider.ChangeAttributeValues:
-            attrs = {1: SuricatesInstance.ConstraintTypeToString(constraint.typeIn),
-                    2: SuricatesInstance.ConstraintTypeToString(constraint.typeOut),
-                    3:constraint.buffer,
-                    4:constraint.priority}
+            fields = self.getConfigFields(layer)
+            attrs = {fields['typeIn']: SuricatesInstance.ConstraintTypeToString(constraint.typeIn),
+                    fields['typeOut']: SuricatesInstance.ConstraintTypeToString(constraint.typeOut),
+                    fields['buffer']:constraint.buffer,
+                    fields['priority']:constraint.priority}
+            # all the attributes are written by one call of the provider (no editing session: the layer isn't in edit mode)
             layer.dataProvider().changeAttributeValues({fid: attrs})
 
-        layer.updateExtents()
-        layer.updateFields()
-        layer.commitChanges()
-
-        Debug.end("SuricatesInstance::modifyConstraintInConfig")
         return True
 
     ## @brief append a constraint in 'project_config'
@@ -2228,70 +2652,75 @@ class SuricatesInstance():
     # @param constraint constraint to save (ConstraintItem)
     # @return true
     def appendConstraintInConfig(self, configNode, constraint):
-        Debug.begin("SuricatesInstance::appendConstraintInConfig")
-        layer_shp =	 QgsProject.instance().mapLayer(configNode.layerId())
+        return self.appendConstraintsInConfig(configNode, [constraint])
+
+    ## @brief append constraints in 'project_config'
+    # @param configNode node of the 'project_config' (QgsLayerTreeLayer)
+    # @param constraints constraints to save (list of ConstraintItem)
+    # @return true if the features are added
+    #
+    # the features are written by one call of the provider for all the constraints
+    @Debug.traced("SuricatesInstance::appendConstraintsInConfig")
+    def appendConstraintsInConfig(self, configNode, constraints):
+        layer_shp = configNode.layer()
 
         pr = layer_shp.dataProvider()
 
-        feat = QgsFeature(layer_shp.fields())
-        feat.setAttribute('base', constraint.name)
-        print(constraint.typeIn)
-        print(constraint.typeOut)
-        feat.setAttribute('typeIn', SuricatesInstance.ConstraintTypeToString(constraint.typeIn) )
-        feat.setAttribute('typeOut', SuricatesInstance.ConstraintTypeToString(constraint.typeOut) )
-        feat.setAttribute('buffer', constraint.buffer)
-        feat.setAttribute('priority', constraint.priority)
-        geom = QgsGeometry()
-        feat.setGeometry(geom)
-
-        pr.addFeatures([feat])
-        layer_shp.updateExtents()
-        layer_shp.updateFields()
-        layer_shp.commitChanges()
-        Debug.end("SuricatesInstance::appendConstraintInConfig")
-        return True
+        fields = self.getConfigFields(layer_shp)
+        features = list()
+        for constraint in constraints:
+            feat = QgsFeature(layer_shp.fields())
+            feat.setAttribute(fields['base'], constraint.name)
+            feat.setAttribute(fields['typeIn'], SuricatesInstance.ConstraintTypeToString(constraint.typeIn) )
+            feat.setAttribute(fields['typeOut'], SuricatesInstance.ConstraintTypeToString(constraint.typeOut) )
+            feat.setAttribute(fields['buffer'], constraint.buffer)
+            feat.setAttribute(fields['priority'], constraint.priority)
+            geom = QgsGeometry()
+            feat.setGeometry(geom)
+            features.append(feat)
+
+        # the features have no geometry: neither the fields nor the extent of the layer change
+        ok, _ = pr.addFeatures(features)
+        return ok
 
     ## @brief delete a constraint from project_config
     # @param projectName name of the project (string)
     # @param constraintName name of the constraint (string)
     def deleteConstraint(self, projectName, constraintName):
-        Debug.begin("SuricatesInstance::deleteConstraint")
+        self.deleteConstraints(projectName, [constraintName])
+
+    ## @brief delete constraints from project_config
+    # @param projectName name of the project (string)
+    # @param constraintNames names of the constraints (list of string)
+    #
+    # the features are searched by one request and deleted by one call of the provider for all the constraints
+    @Debug.traced("SuricatesInstance::deleteConstraints")
+    def deleteConstraints(self, projectName, constraintNames):
         projectnode = self.getProject(projectName)
         # remove item from the file config
         confignode = self.getConfig(projectnode)
         if confignode == None: return
-        layer = QgsProject.instance().mapLayer(confignode.layerId())
+        layer = confignode.layer()
         if layer == None: return
 
-        ok = False
-        for feature in layer.getFeatures():
-            if feature["base"] == constraintName:
-                fid = feature.id()
-                ok = True
-
-        if not ok: return
+        fids = SuricatesInstance.findConstraintFeatures(layer, constraintNames)
+        if len(fids) == 0: return
 
         if layer.dataProvider().capabilities() & QgsVectorDataProvider.DeleteFeatures:
-            res = layer.dataProvider().deleteFeatures([fid])
+            res = layer.dataProvider().deleteFeatures(fids)
 
-        layer.updateExtents()
-        layer.updateFields()
-        layer.commitChanges()
-
-        Debug.end("SuricatesInstance::deleteConstraint")
         return
 
     ## @brief select project from text
     # @param projectName of the project to process (string)
+    @Debug.traced("SuricatesInstance::selectProject")
     def selectProject(self, projectName):
-        Debug.begin("SuricatesInstance::selectProject")
 
-        if projectName != None : Debug.print("selection:" + projectName)
+        if projectName != None : Debug.print(f"selection:{projectName}")
         else: Debug.print("selection: empty")
 
         self.dock.w_suricates.setProject(projectName)
 
-        Debug.end("SuricatesInstance::selectProject")
         return
 
     ## @brief display a list of projects (Debug mode)
@@ -2318,23 +2747,28 @@ class SuricatesInstance():
     def displayConstraints(constraints):
         Debug.begin("SuricatesInstance::displayConstraints: " + str(len(constraints)))
         for i in constraints:
-            Debug.print(i.name + " " + SuricatesInstance.ConstraintTypeToString(i.typeIn) + " " + SuricatesInstance.ConstraintTypeToString(i.typeOut) + " " + str(i.buffer) + " " + str(i.priority) )
+            typeIn, typeOut = SuricatesInstance.ConstraintTypeToString(i.typeIn), SuricatesInstance.ConstraintTypeToString(i.typeOut)
+            Debug.print(f"{i.name} {typeIn} {typeOut} {i.buffer} {i.priority}")
         Debug.end("SuricatesInstance::displayConstraints")
 
+## @brief instance started by mainProgram (SuricatesInstance), None if no instance is started
+pmanager = None
+
 ## @brief main program: close previous instance if exists and start a new one
 def mainProgram(iface):
     global pmanager
     # close previous suricates instance if exist
-    try:
-        if not pmanager is None:
-            pmanager.closeInstance()
-    except:
-        pass
+    if not pmanager is None:
+        # the widgets of the previous instance may be already deleted by QGIS
+        try: pmanager.closeInstance()
+        except RuntimeError as e: Debug.print("SuricatesApp::mainProgram: " + str(e))
+        pmanager = None
 
     # create new suricates instance
     pmanager = SuricatesInstance(iface)
     # search group 'Projects' and its contents
     pmanager.initializeProjectNode()
     pmanager.updateProjects()
+    pmanager.dock.w_suricates.readyToShow.emit()
 
 # mainProgram(iface)
@@ -31,8 +31,6 @@ from qgis.PyQt.QtCore import QSettings, QTranslator, QCoreApplication, Qt
 from qgis.PyQt.QtGui import QIcon
 from qgis.PyQt.QtWidgets import QAction
 
-# Import the code for the DockWidget
-from .SuricatesApp import *
 import os.path
 # Import resources
 from .resources import *
@@ -105,9 +103,16 @@ class SuricatesPlugin:
 			self.iface.removePluginMenu(
 				u'&RAIES',
 				action)
+		# the signals of the project are disconnected: a reloaded plugin doesn't keep the handlers of the previous one
+		if not self.pmanager is None:
+			self.pmanager.closeInstance()
+			self.pmanager = None
 
 	## @brief Run method that loads and starts the plugin
 	def run(self):
+		# the code of the DockWidget (numpy, gdal, processing) is imported at the first run, not at the start of QGIS
+		from .SuricatesApp import SuricatesInstance
+
 		# close previous suricate instance if exist
 		if not self.pmanager is None:
 			self.pmanager.closeInstance()
@@ -117,3 +122,5 @@ class SuricatesPlugin:
 		# search group 'Projects' and its contents 
 		self.pmanager.initializeProjectNode()
 		self.pmanager.updateProjects()
+		# the projects are loaded: the credit widget can be replaced by the main widget
+		self.pmanager.dock.w_suricates.readyToShow.emit()
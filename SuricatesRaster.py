@@ -0,0 +1,526 @@
+## @file SuricatesRaster.py
+#
+# @date 2024
+# @version 1.01
+# @author Vincent MAJORCZYK
+# @copyright Copyright 2020-2024 CDI-Technologies (France), all right reserved.
+# @par License:
+# code released under GNU General Public License v3
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program.  If not, see <https://www.gnu.org/licenses/>.
+#
+# @par CDI-Technologies:
+# *23 avenue de la créativité, 59650 Villeneuve d'Ascq, France*
+# https://cditech.fr/raies/
+
+from osgeo import gdal
+from osgeo import gdal_array
+import numpy as np
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# numba is optional: it is not provided by every QGIS installation
+try:
+    from numba import njit, prange
+    hasNumba = True
+except ImportError:
+    hasNumba = False
+    prange = range
+
+# numexpr is optional: it accelerates the evaluation of the formulas on large arrays
+try:
+    import numexpr
+    hasNumexpr = True
+except ImportError:
+    hasNumexpr = False
+
+## @brief value of the no-data cells of the rasters created by the application
+NODATA = -9999
+
+## @brief type of the cells of the rasters created by the application
+#
+# the values are normalized (between 0 and the priority of the constraint): float32 is precise enough and halves the memory used by float64.
+# The processing algorithms use the same type (`DATA_TYPE`/`RTYPE` 5 or 6 depending on the algorithm: Float32).
+RASTER_TYPE = np.float32
+
+## @brief GDAL type corresponding to RASTER_TYPE
+RASTER_GDAL_TYPE = gdal.GDT_Float32
+
+## @brief type of the cells of the mask rasters (rasterized layers, inverted layers): only data and no-data cells are used
+MASK_TYPE = np.uint8
+
+## @brief value of the no-data cells of the mask rasters
+MASK_NODATA = 255
+
+## @brief creation options of the GTiff driver for the final rasters: tiled to be read by blocks, compressed
+TILED_OPTIONS = ['TILED=YES', 'COMPRESS=LZW']
+
+## @brief decimation factors of the overviews of the final rasters
+OVERVIEW_LEVELS = [2, 4, 8, 16]
+
+## @brief number of cells under which the final rasters don't need overviews (QGIS draws them quickly)
+OVERVIEW_MIN_CELLS = 1000000
+
+## @brief folder of the files kept in memory by GDAL
+#
+# these files are only visible by GDAL in the current process: they can't be used by the processing algorithms (executed in other processes).
+MEMORY_PATH = '/vsimem/'
+
+## @brief check if a file is kept in memory by GDAL
+# @param fileName name of the file
+# @return True if the file is in MEMORY_PATH
+def isMemoryFile(fileName):
+    return fileName.startswith(MEMORY_PATH)
+
+## @brief raster band loaded in memory
+#
+# This structure is an interface between the raster files (read and written with GDAL) and the numerical kernels of this file.
+# It keeps the georeferencing of the file to write outputs aligned with the input.
+class RasterBand:
+    ## @var array
+    # values of the cells (numpy array, rows x columns)
+
+    ## @var geoTransform
+    # affine transformation of the raster (GDAL geotransform)
+
+    ## @var projection
+    # coordinate reference system of the raster (WKT)
+
+    ## @var noData
+    # value of the no-data cells (None if the raster has no no-data value)
+
+    ## @brief constructor
+    # @param array values of the cells
+    # @param geoTransform affine transformation of the raster
+    # @param projection coordinate reference system of the raster
+    # @param noData value of the no-data cells
+    def __init__(self, array, geoTransform, projection, noData):
+        self.array = array
+        self.geoTransform = geoTransform
+        self.projection = projection
+        self.noData = noData
+
+    ## @brief get the data cells of the raster
+    # @return boolean array: True for data cells, False for no-data cells
+    def valid(self):
+        if self.noData is None:
+            return np.ones(self.array.shape, dtype=bool)
+        return self.array != self.noData
+
+## @brief read the first band of a raster file
+# @param rasterName name of the raster file
+# @return the band (RasterBand) or None if the file can't be opened
+def readBand(rasterName):
+    dataset = gdal.Open(rasterName)
+    if dataset is None:
+        return None
+    band = dataset.GetRasterBand(1)
+    return RasterBand(band.ReadAsArray(), dataset.GetGeoTransform(), dataset.GetProjection(), band.GetNoDataValue())
+
+## @brief write an array in a raster file (.tif)
+# @param rasterName name of the output raster file
+# @param array values of the cells
+# @param like RasterBand which gives the georeferencing of the output
+# @param noData value of the no-data cells
+# @param options creation options of the GTiff driver (example: `['COMPRESS=LZW']`)
+# @return the name of the output raster file
+def writeBand(rasterName, array, like, noData = NODATA, options = None):
+    rows, cols = array.shape
+    dataType = gdal_array.NumericTypeCodeToGDALTypeCode(array.dtype.type)
+    dataset = gdal.GetDriverByName('GTiff').Create(rasterName, cols, rows, 1, dataType, options or [])
+    dataset.SetGeoTransform(like.geoTransform)
+    dataset.SetProjection(like.projection)
+    band = dataset.GetRasterBand(1)
+    band.SetNoDataValue(noData)
+    band.WriteArray(array)
+    band.FlushCache()
+    # the file is closed (and completed) when the dataset is released
+    dataset = None
+    return rasterName
+
+## @brief build the overviews of a raster file (in the file or in a .ovr file, depending on the format)
+# @param rasterName name of the raster file
+#
+# QGIS draws the zoomed out views from the overviews instead of the full resolution raster.
+# The cells of the overviews are the average of the data cells (the no-data cells are ignored).
+def buildOverviews(rasterName):
+    dataset = gdal.Open(rasterName, gdal.GA_Update)
+    if dataset == None: return
+    if dataset.RasterXSize * dataset.RasterYSize >= OVERVIEW_MIN_CELLS:
+        dataset.BuildOverviews('AVERAGE', OVERVIEW_LEVELS)
+    dataset = None
+
+## @brief number of rows read at once by the functions which process rasters by blocks
+BLOCK_ROWS = 2048
+
+## @brief rasterize the features of a vector layer on a strip of rows (mask: 0 on the features, MASK_NODATA elsewhere)
+# @param path name of the vector file
+# @param layerName name of the layer in the vector file
+# @param xMin left bound of the strip
+# @param yMax top bound of the strip
+# @param width number of columns of the strip
+# @param height number of rows of the strip
+# @param resolution size of the cells
+# @param projection coordinate reference system of the strip (WKT)
+# @return the cells of the strip (MASK_TYPE)
+#
+# the vector file is opened by each call: an OGR dataset must not be shared between threads.
+# Only the features which intersect the strip are read (spatial filter of the layer).
+def rasterizeStrip(path, layerName, xMin, yMax, width, height, resolution, projection):
+    source = gdal.OpenEx(path, gdal.OF_VECTOR)
+    layer = source.GetLayerByName(layerName)
+    layer.SetSpatialFilterRect(xMin, yMax - height * resolution, xMin + width * resolution, yMax)
+    strip = gdal.GetDriverByName('MEM').Create('', width, height, 1, gdal.GDT_Byte)
+    strip.SetGeoTransform((xMin, resolution, 0, yMax, 0, -resolution))
+    strip.SetProjection(projection)
+    band = strip.GetRasterBand(1)
+    band.Fill(MASK_NODATA)
+    gdal.RasterizeLayer(strip, [1], layer, burn_values=[0])
+    array = band.ReadAsArray()
+    strip = None
+    source = None
+    return array
+
+## @brief rasterize a vector layer in a mask raster file (.tif): 0 on the features, MASK_NODATA elsewhere
+# @param rasterName name of the output raster file
+# @param path name of the vector file
+# @param layerName name of the layer in the vector file
+# @param bounds bounds of the output (xMin, yMin, xMax, yMax) in the coordinate reference system of the layer
+# @param resolution size of the cells
+# @param workers number of strips rasterized at the same time
+# @return the name of the output raster file
+#
+# same grid as `gdal.Rasterize` with `outputBounds` and `xRes`/`yRes`: the origin is the top left corner of bounds.
+# The output is split in strips of BLOCK_ROWS rows rasterized in parallel (threads), the strips are written by the calling thread.
+def rasterizeLayer(rasterName, path, layerName, bounds, resolution, workers):
+    xMin, yMin, xMax, yMax = bounds
+    width = int((xMax - xMin) / resolution + 0.5)
+    height = int((yMax - yMin) / resolution + 0.5)
+    source = gdal.OpenEx(path, gdal.OF_VECTOR)
+    projection = source.GetLayerByName(layerName).GetSpatialRef().ExportToWkt()
+    source = None
+
+    output = gdal.GetDriverByName('GTiff').Create(rasterName, width, height, 1, gdal.GDT_Byte)
+    output.SetGeoTransform((xMin, resolution, 0, yMax, 0, -resolution))
+    output.SetProjection(projection)
+    band = output.GetRasterBand(1)
+    band.SetNoDataValue(MASK_NODATA)
+
+    strips = [(y, min(BLOCK_ROWS, height - y)) for y in range(0, height, BLOCK_ROWS)]
+    with ThreadPoolExecutor(max_workers=max(1, min(workers, len(strips)))) as executor:
+        arrays = executor.map(lambda strip: rasterizeStrip(path, layerName, xMin, yMax - strip[0] * resolution, width, strip[1], resolution, projection), strips)
+        for (y, _), array in zip(strips, arrays):
+            band.WriteArray(array, 0, y)
+    band.FlushCache()
+    output = None
+    return rasterName
+
+## @brief stack rasters as the bands of a virtual raster (.vrt in memory)
+# @param rasterNames names of the raster files (same size and georeferencing)
+# @param outputName name of the raster computed from the stack (used to name the stack)
+# @return the name of the virtual raster, it must be released with `gdal.Unlink`
+#
+# the virtual raster only references the files: the rasters are read band by band through a single dataset.
+def stackBands(rasterNames, outputName):
+    stackName = MEMORY_PATH + os.path.basename(outputName) + '.vrt'
+    stack = gdal.BuildVRT(stackName, rasterNames, separate=True)
+    stack = None
+    return stackName
+
+## @brief sum a block of rows of the bands of a raster cell by cell
+# @param stackName name of the raster whose bands are summed (see stackBands)
+# @param y first row of the block
+# @param height number of rows of the block
+# @return the sum (float32) and the boolean array of the data cells of the block
+#
+# the raster is opened by each call: a GDAL dataset must not be shared between threads.
+#
+# the blocks are summed by pairs (pairwise summation, like a binary counter): the rounding error grows with log(N) instead of N
+# and only log(N) partial sums are kept in memory.
+def cumulateBlock(stackName, y, height):
+    dataset = gdal.Open(stackName)
+    partials = list() # partial sums and their number of rasters (decreasing powers of 2)
+    valid = None
+    for b in range(dataset.RasterCount):
+        band = dataset.GetRasterBand(b + 1)
+        block = band.ReadAsArray(0, y, dataset.RasterXSize, height)
+        if valid is None: valid = np.ones(block.shape, dtype=bool)
+        noData = band.GetNoDataValue()
+        if noData is not None: valid &= block != noData
+
+        acc = block.astype(RASTER_TYPE, copy=False)
+        count = 1
+        while partials and partials[-1][1] == count:
+            previous, _ = partials.pop()
+            np.add(previous, acc, out=previous)
+            acc = previous
+            count *= 2
+        partials.append((acc, count))
+
+    dataset = None
+    acc = partials.pop()[0]
+    while partials:
+        np.add(acc, partials.pop()[0], out=acc)
+    return acc, valid
+
+## @brief normalize the data cells of an array between 0 and coef
+#
+# the other cells are set to NODATA.
+# The formula is evaluated by numexpr (multithreaded) if it is available, by numpy otherwise.
+# @param array values to normalize
+# @param valid boolean array of the cells to keep
+# @param invert invert min (0) and max (coef)
+# @param coef maximum value
+# @param statistics (min, max) of the data cells if they are already known
+# @return the normalized array (float32)
+def normalizeArray(array, valid, invert, coef, statistics = None):
+    if not valid.any():
+        return np.full(array.shape, NODATA, dtype=RASTER_TYPE)
+
+    if statistics is None:
+        min = array.min(where=valid, initial=np.inf)
+        max = array.max(where=valid, initial=-np.inf)
+    else:
+        min, max = statistics
+    if max-min == 0:
+        if min != 0: min = 0
+        else: max = 1
+
+    A = array
+    mn = RASTER_TYPE(min)
+    span = RASTER_TYPE(max - min)
+    c = RASTER_TYPE(coef)
+    if hasNumexpr:
+        formula = '(1-(A-mn)/span)*c' if invert else '((A-mn)/span)*c'
+        return numexpr.evaluate('where(valid, ' + formula + ', nodata)', local_dict={'A': A, 'mn': mn, 'span': span, 'c': c, 'valid': valid, 'nodata': RASTER_TYPE(NODATA)}).astype(RASTER_TYPE, copy=False)
+
+    out = (A - mn) / span
+    if invert: out = 1 - out
+    out *= c
+    np.copyto(out, NODATA, where=~valid)
+    return out.astype(RASTER_TYPE, copy=False)
+
+## @brief threshold an array in place: the cells greater or equal to threshold become no-data
+# @param array array of values (float32), it is modified
+# @param threshold threshold value
+# @return the array
+#
+# the comparison and the copy are vectorized by numpy without temporary array of values.
+# The no-data cells (-9999) are lower than threshold: they stay no-data
+def thresholdArray(array, threshold):
+    np.copyto(array, RASTER_TYPE(NODATA), where=array >= threshold)
+    return array
+
+## @brief create an empty raster file (.tif) aligned with another raster
+# @param rasterName name of the output raster file
+# @param like GDAL dataset which gives the size and the georeferencing of the output
+# @param options creation options of the GTiff driver
+# @return the GDAL dataset (the file is completed when the dataset is released)
+def createLike(rasterName, like, options = None):
+    output = gdal.GetDriverByName('GTiff').Create(rasterName, like.RasterXSize, like.RasterYSize, 1, RASTER_GDAL_TYPE, options or [])
+    output.SetGeoTransform(like.GetGeoTransform())
+    output.SetProjection(like.GetProjection())
+    output.GetRasterBand(1).SetNoDataValue(NODATA)
+    return output
+
+## @brief sum rasters, normalize the sum between 0 and 1 and threshold it
+#
+# the sum is kept in memory: the inputs are read once and the outputs are written once
+# (same results as the sum of the rasters, then normalizeArray and the threshold).
+# A cell is no-data in the outputs if it is no-data in one of the inputs.
+# In the thresholded output, the cells greater or equal to threshold are no-data.
+#
+# the rasters are processed by blocks of BLOCK_ROWS rows in parallel (threads), in two passes:
+# - the blocks are summed in the shared array and return their minimum and maximum;
+# - the blocks are normalized with the global minimum and maximum.
+#
+# the outputs are written by the calling thread.
+# @param rasterNames names of the input raster files (same size and georeferencing)
+# @param rasterName name of the output raster file of the normalized sum
+# @param thresholdName name of the output raster file of the thresholded sum
+# @param threshold threshold value (between 0 and 1)
+def finalizeBands(rasterNames, rasterName, thresholdName, threshold):
+    stackName = stackBands(rasterNames, rasterName)
+    like = gdal.Open(stackName)
+    rows = like.RasterYSize
+    blocks = [(y, min(BLOCK_ROWS, rows - y)) for y in range(0, rows, BLOCK_ROWS)]
+    acc = np.empty((rows, like.RasterXSize), dtype=RASTER_TYPE)
+    valid = np.empty((rows, like.RasterXSize), dtype=bool)
+
+    # first pass: sum and local statistics of each block
+    def cumulate(block):
+        y, height = block
+        acc[y:y+height], valid[y:y+height] = cumulateBlock(stackName, y, height)
+        if not valid[y:y+height].any(): return None
+        values = acc[y:y+height]
+        return values.min(where=valid[y:y+height], initial=np.inf), values.max(where=valid[y:y+height], initial=-np.inf)
+
+    # second pass: normalization of each block with the global statistics
+    def normalize(block):
+        y, height = block
+        acc[y:y+height] = normalizeArray(acc[y:y+height], valid[y:y+height], False, 1, statistics)
+
+    with ThreadPoolExecutor(max_workers=os.cpu_count() or 1) as executor:
+        local = [s for s in executor.map(cumulate, blocks) if s is not None]
+        statistics = (min(s[0] for s in local), max(s[1] for s in local)) if local else None
+        if statistics is None: acc.fill(NODATA)
+        else: list(executor.map(normalize, blocks))
+
+    output = createLike(rasterName, like)
+    output.GetRasterBand(1).WriteArray(acc)
+    output = None
+
+    thresholdArray(acc, threshold)
+    output = createLike(thresholdName, like, TILED_OPTIONS)
+    output.GetRasterBand(1).WriteArray(acc)
+    output = None
+    like = None
+    gdal.Unlink(stackName)
+
+## @brief value used as infinite distance by the distance transforms
+FAR = 1e20
+
+## @brief squared euclidean distance transform of a sampled function in one dimension
+#
+# lower envelope of parabolas (Felzenszwalb & Huttenlocher, *Distance Transforms of Sampled Functions*): linear time.
+# @param f squared distance at each sample (0 on targets, FAR elsewhere)
+# @param d output squared distances (same size as f)
+# @param v working array of integers (same size as f)
+# @param z working array of floats (size of f + 1)
+def distanceTransform1d(f, d, v, z):
+    n = f.shape[0]
+    k = 0
+    v[0] = 0
+    z[0] = -FAR
+    z[1] = FAR
+    for q in range(1, n):
+        s = ((f[q] + q*q) - (f[v[k]] + v[k]*v[k])) / (2*q - 2*v[k])
+        while s <= z[k]:
+            k -= 1
+            s = ((f[q] + q*q) - (f[v[k]] + v[k]*v[k])) / (2*q - 2*v[k])
+        k += 1
+        v[k] = q
+        z[k] = s
+        z[k+1] = FAR
+    k = 0
+    for q in range(n):
+        while z[k+1] < q:
+            k += 1
+        d[q] = (q - v[k])*(q - v[k]) + f[v[k]]
+
+## @brief squared euclidean distance transform of some rows of a 2d array (in the calling thread)
+# @param f squared distances (0 on targets, FAR elsewhere), modified in place
+# @param first first row to transform
+# @param last row after the last row to transform
+def distanceTransformRows(f, first, last):
+    cols = f.shape[1]
+    d = np.empty(cols)
+    v = np.empty(cols, dtype=np.int64)
+    z = np.empty(cols + 1)
+    for r in range(first, last):
+        distanceTransform1d(f[r], d, v, z)
+        f[r, :] = d
+
+## @brief number of rows transformed by each step of distanceTransformRowsParallel
+DISTANCE_CHUNK_ROWS = 64
+
+## @brief squared euclidean distance transform of each row of a 2d array, by chunks of rows in parallel (threads of numba)
+# @param f squared distances (0 on targets, FAR elsewhere), modified in place
+def distanceTransformRowsParallel(f):
+    rows = f.shape[0]
+    chunks = (rows + DISTANCE_CHUNK_ROWS - 1) // DISTANCE_CHUNK_ROWS
+    for c in prange(chunks):
+        distanceTransformRows(f, c * DISTANCE_CHUNK_ROWS, min(rows, (c + 1) * DISTANCE_CHUNK_ROWS))
+
+## @brief number of columns copied at once in the buffer of distanceTransformColumns
+DISTANCE_BLOCK_COLUMNS = 64
+
+## @brief squared euclidean distance transform of some columns of a 2d array (in the calling thread)
+#
+# the columns are copied by blocks of DISTANCE_BLOCK_COLUMNS in a transposed buffer: each transform reads and writes contiguous memory
+# and the whole array isn't copied (the buffer holds DISTANCE_BLOCK_COLUMNS columns).
+# @param f squared distances (0 on targets, FAR elsewhere), modified in place
+# @param first first column to transform
+# @param last column after the last column to transform
+def distanceTransformColumns(f, first, last):
+    rows = f.shape[0]
+    t = np.empty((DISTANCE_BLOCK_COLUMNS, rows))
+    d = np.empty(rows)
+    v = np.empty(rows, dtype=np.int64)
+    z = np.empty(rows + 1)
+    for c0 in range(first, last, DISTANCE_BLOCK_COLUMNS):
+        n = min(DISTANCE_BLOCK_COLUMNS, last - c0)
+        for r in range(rows):
+            for j in range(n):
+                t[j, r] = f[r, c0 + j]
+        for j in range(n):
+            distanceTransform1d(t[j], d, v, z)
+            t[j, :] = d
+        for r in range(rows):
+            for j in range(n):
+                f[r, c0 + j] = t[j, r]
+
+## @brief squared euclidean distance transform of each column of a 2d array, by blocks of columns in parallel (threads of numba)
+# @param f squared distances (0 on targets, FAR elsewhere), modified in place
+def distanceTransformColumnsParallel(f):
+    cols = f.shape[1]
+    blocks = (cols + DISTANCE_BLOCK_COLUMNS - 1) // DISTANCE_BLOCK_COLUMNS
+    for b in prange(blocks):
+        distanceTransformColumns(f, b * DISTANCE_BLOCK_COLUMNS, min(cols, (b + 1) * DISTANCE_BLOCK_COLUMNS))
+
+if hasNumba:
+    distanceTransform1d = njit(cache=True)(distanceTransform1d)
+    distanceTransformRows = njit(cache=True)(distanceTransformRows)
+    distanceTransformRowsParallel = njit(parallel=True, cache=True)(distanceTransformRowsParallel)
+    distanceTransformColumns = njit(cache=True)(distanceTransformColumns)
+    distanceTransformColumnsParallel = njit(parallel=True, cache=True)(distanceTransformColumnsParallel)
+
+## @brief held while a parallel distance transform runs
+#
+# the default threading layer of numba (workqueue) aborts the process if two threads run parallel regions at the same time:
+# the other callers use the transform in their own thread.
+parallelDistanceLock = threading.Lock()
+
+## @brief squared euclidean distance transform of a 2d array (columns then rows)
+# @param f squared distances (0 on targets, FAR elsewhere), modified in place
+# @param parallel use the threads of numba (if no other parallel transform is running), False if the caller is already one of several threads
+def distanceTransform2d(f, parallel = True):
+    rows, cols = f.shape
+    if parallel and parallelDistanceLock.acquire(blocking=False):
+        try:
+            distanceTransformColumnsParallel(f)
+            distanceTransformRowsParallel(f)
+        finally:
+            parallelDistanceLock.release()
+    else:
+        distanceTransformColumns(f, 0, cols)
+        distanceTransformRows(f, 0, rows)
+
+## @brief distance of each cell to the nearest target cell (in pixels)
+#
+# this is the exact equivalent of the algorithm *gdal:proximity* with pixel units and no maximum distance.
+# @param targets boolean array of the target cells
+# @param parallel use the threads of numba, False if the caller is already one of several threads (see distanceTransform2d)
+# @return distances (float32), all cells are NODATA if there is no target
+# @note the computation is fast only with numba: without numba, the algorithm *gdal:proximity* must be prefered
+def proximityArray(targets, parallel = True):
+    if not targets.any():
+        return np.full(targets.shape, NODATA, dtype=RASTER_TYPE)
+    # the squared distances are computed in float64: float32 isn't exact over 2^24 (distances over 4096 cells)
+    f = np.where(targets, 0.0, FAR)
+    distanceTransform2d(f, parallel)
+    # the square root is computed in place: the float64 array isn't copied before the conversion
+    np.sqrt(f, out=f)
+    return f.astype(RASTER_TYPE)